@@ -0,0 +1,159 @@
+from presentation import Presentation
+from complex import Complex, Morphism as ComplexMorphism
+from graph import Morphism as GraphMorphism
+from canonical import canonical_form, codomain_ranks
+from folding import fold_complex_morphism
+from facialtree import get_children
+from labels import Edge, Vertex
+import binaryformat
+import verification
+import json, sys, time, random, tracemalloc
+
+'''
+	Benchmarks for the folding and facial tree machinery. Run with
+		python benchmarks.py [name ...]
+	to run the named benchmarks, or all of them if none are given.
+'''
+
+def presentation_complex(w = 'abbaB', n = 1):
+	P = Presentation.from_strings(['a', 'b'], [w, 'b' + 'a'*n + 'B' + 'A'*(n + 1)])
+	return P.complex()
+
+'''
+	Random walk down the facial tree of X, expanding every child at each step. Returns the number of children built,
+	and adds the children to pieces if given. If stable, children are chosen from in the order of their canonical forms,
+	as the order of get_children follows set iteration, i.e. the uids of the run, so the same seed gives the same walk.
+	This sorting costs about as much as building the children.
+'''
+def random_walk(X, depth, seed = 0, pieces = None, stable = True):
+	rng = random.Random(seed)
+	ranks = codomain_ranks(X)
+	f = Complex.disc_diagram(X, X.faces[0], 1)
+	parent = fold_complex_morphism(f, include_proj = False)
+
+	built = 0
+	for d in range(depth):
+		children = get_children(X, parent)
+		built += len(children)
+		if pieces != None:
+			pieces += children
+		if len(children) == 0:
+			break
+		if stable:
+			children.sort(key = lambda child: canonical_form(child, ranks))
+		parent = rng.choice(children)
+
+	return built
+
+def timed(func, *args, **kw):
+	start = time.perf_counter()
+	res = func(*args, **kw)
+	return res, time.perf_counter() - start
+
+# Rebuilds the graph and complex morphisms of the pieces, as the folding code does, rounds times
+def rebuild_morphisms(pieces, rounds):
+	for _ in range(rounds):
+		for f in pieces:
+			g = GraphMorphism(f.f.domain, f.f.codomain, f.f.f_V, f.f.f_E, trusted = True)
+			ComplexMorphism(f.domain, f.codomain, g, f.face_maps, trusted = True)
+
+'''
+	Cost of the verification levels, on the same pieces at every level: the pieces of a few walks are built once, and
+	only the construction of their morphisms is timed at each level.
+'''
+def bench_verification(depth = 5, walks = 3, rounds = 20):
+	X = presentation_complex()
+	pieces = []
+	for seed in range(walks):
+		random_walk(X, depth, seed = seed, pieces = pieces)
+
+	names = {verification.OFF: 'off', verification.CHEAP: 'cheap', verification.FULL: 'full'}
+	for level in [verification.FULL, verification.CHEAP, verification.OFF]:
+		with verification.verification_level(level):
+			_, elapsed = timed(rebuild_morphisms, pieces, rounds)
+		built = len(pieces)*rounds
+		print(f'verification={names[level]:<6} {built} morphisms in {elapsed:.2f}s ({1e6 * elapsed / max(built, 1):.1f}us per morphism)')
+
+'''
+	Memory and hashing cost of the slotted labels, compared against unslotted subclasses (which carry a __dict__)
+	and the string hashing labels used to do, followed by the peak memory of a facial tree walk.
+'''
+def bench_labels(n = 100000, depth = 6):
+	class DictVertex(Vertex):
+		pass
+	class DictEdge(Edge):
+		pass
+
+	for name, V, E in [('slotted', Vertex, Edge), ('unslotted', DictVertex, DictEdge)]:
+		tracemalloc.start()
+		vertices = [V() for _ in range(n)]
+		edges = [E(vertices[i], vertices[i - 1]) for i in range(n)]
+		size, _ = tracemalloc.get_traced_memory()
+		tracemalloc.stop()
+		print(f'{name:<10} {size / (2 * n):.0f} bytes per label')
+		del vertices, edges
+
+	vertices = [Vertex() for _ in range(n)]
+	for name, key in [('uid', hash), ('string', lambda v: hash(f'Vertex{v.uid}'))]:
+		_, elapsed = timed(lambda: [key(v) for v in vertices])
+		print(f'{name + " hash":<10} {1e9 * elapsed / n:.0f}ns per hash')
+
+	X = presentation_complex()
+	tracemalloc.start()
+	built, elapsed = timed(random_walk, X, depth, stable = False)
+	_, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	print(f'facial tree walk: {built} children in {elapsed:.2f}s, peak {peak / 2**20:.1f}MiB')
+
+'''
+	get_children on a piece grown for grow steps, serially and on pools of the given sizes.
+'''
+def bench_parallel(grow = 12, sizes = [2, 4]):
+	import multiprocessing as mp
+
+	X = presentation_complex()
+	rng = random.Random(0)
+	piece = fold_complex_morphism(Complex.disc_diagram(X, X.faces[0], 1), include_proj = False)
+	for _ in range(grow):
+		piece = rng.choice(get_children(X, piece))
+
+	children, elapsed = timed(get_children, X, piece)
+	print(f'serial     {len(children)} children in {elapsed:.2f}s')
+	for size in sizes:
+		with mp.Pool(size) as pool:
+			children, elapsed = timed(get_children, X, piece, pool = pool)
+		print(f'{size} workers  {len(children)} children in {elapsed:.2f}s')
+
+def bench_serialization(depth = 6):
+	X = presentation_complex()
+	rng = random.Random(0)
+	parent = fold_complex_morphism(Complex.disc_diagram(X, X.faces[0], 1), include_proj = False)
+	pieces = []
+	for d in range(depth):
+		children = get_children(X, parent)
+		if len(children) == 0:
+			break
+		pieces += children
+		parent = rng.choice(children)
+
+	data, save = timed(lambda: [json.dumps(f.json()) for f in pieces])
+	_, load = timed(lambda: [ComplexMorphism.load_json(json.loads(s)) for s in data])
+	print(f'json    {len(pieces)} pieces, {sum(map(len, data))} bytes, save {save:.3f}s load {load:.3f}s')
+	data, save = timed(binaryformat.dumps_all, pieces)
+	_, load = timed(binaryformat.loads_all, data)
+	print(f'binary  {len(pieces)} pieces, {len(data)} bytes, save {save:.3f}s load {load:.3f}s')
+
+BENCHMARKS = {
+	'verification': bench_verification,
+	'labels': bench_labels,
+	'parallel': bench_parallel,
+	'serialization': bench_serialization,
+}
+
+if __name__ == '__main__':
+	names = sys.argv[1:] if len(sys.argv) > 1 else list(BENCHMARKS.keys())
+	for name in names:
+		if name not in BENCHMARKS:
+			raise Exception(f'Unknown benchmark {name}, expected one of {list(BENCHMARKS.keys())}.')
+		print(f'== {name}')
+		BENCHMARKS[name]()
@@ -0,0 +1,270 @@
+from array import array
+from graph import Graph, Morphism as GraphMorphism
+from complex import Complex, Morphism, FaceMap
+from setfunction import SetFunction
+from face import Face
+from labels import Edge, Vertex
+import struct
+import sys
+
+'''
+	Versioned compact binary format for graphs, complexes and complex morphisms, the json methods staying the format
+	for interchange.
+
+	A file is the magic bytes, the version and a table of records, followed by the indices of the records saved.
+	Records refer to earlier records by index, and objects are written once however often they are referred to, so
+	e.g. immersions saved together with the same codomain store it once, and every face is stored once, in its complex.
+	All integers are little endian, and arrays are a count followed by 32 bit integers:
+		Graph:    vertex labels, then the initial and terminal vertices of the edges in pairs (the k-th edge of the
+		          orientation as 2k and its bar as 2k + 1), then the edge labels.
+		Complex:  its graph, then the face lengths and the edges of all faces in a row.
+		Morphism: its domain and codomain, the images of the vertices and of the oriented edges of the domain, then
+		          the target, start index, orientation and origin start index of the face map of each face.
+	Loading trusts the data, as pickling does, and labels get fresh uids.
+'''
+
+MAGIC = b'NPIB'
+VERSION = 1
+
+GRAPH = 0
+COMPLEX = 1
+MORPHISM = 2
+
+'''
+	Saves the graphs, complexes and complex morphisms objs to the file at path.
+'''
+def save(path, objs):
+	with open(path, 'wb') as f:
+		f.write(dumps_all(objs))
+
+'''
+	Loads the list of objects saved to the file at path.
+'''
+def load(path):
+	with open(path, 'rb') as f:
+		return loads_all(f.read())
+
+def dumps(obj):
+	return dumps_all([obj])
+
+def loads(data):
+	objs = loads_all(data)
+	if len(objs) != 1:
+		raise Exception(f'Expected one object, found {len(objs)}.')
+	return objs[0]
+
+def dumps_all(objs):
+	writer = Writer()
+	top = array('i', [writer.add(obj) for obj in objs])
+
+	out = bytearray(MAGIC)
+	out += struct.pack('<II', VERSION, len(writer.records))
+	for kind, payload in writer.records:
+		out += struct.pack('<BI', kind, len(payload))
+		out += payload
+	_write_ints(out, top)
+	return bytes(out)
+
+def loads_all(data):
+	reader = Reader(data)
+	if reader.read(len(MAGIC)) != MAGIC:
+		raise Exception('Not a binary file of complexes.')
+	version, count = reader.unpack('<II')
+	if version != VERSION:
+		raise Exception(f'Binary file has version {version}, expected {VERSION}.')
+
+	# Each loaded object with the lists its vertices, edges and faces are numbered by
+	records = []
+	for _ in range(count):
+		kind, length = reader.unpack('<BI')
+		payload = Reader(reader.read(length))
+		if kind == GRAPH:
+			records.append(_load_graph(payload))
+		elif kind == COMPLEX:
+			records.append(_load_complex(payload, records))
+		elif kind == MORPHISM:
+			records.append(_load_morphism(payload, records))
+		else:
+			raise Exception(f'Unknown record kind {kind}.')
+
+	return [records[i][0] for i in reader.ints()]
+
+class Writer:
+	def __init__(self):
+		self.records = []
+		# Record index and numbering of the objects written so far, by id
+		self.index = {}
+		# Keeps the objects alive so their ids are not reused while writing
+		self.objs = []
+
+	def add(self, obj):
+		if id(obj) in self.index:
+			return self.index[id(obj)][0]
+
+		if isinstance(obj, Graph):
+			kind, payload, numbering = GRAPH, *self.graph(obj)
+		elif isinstance(obj, Complex):
+			kind, payload, numbering = COMPLEX, *self.complex(obj)
+		elif isinstance(obj, Morphism):
+			kind, payload, numbering = MORPHISM, self.morphism(obj), None
+		else:
+			raise Exception('Only graphs, complexes and complex morphisms can be saved.')
+
+		self.records.append((kind, payload))
+		self.index[id(obj)] = (len(self.records) - 1, numbering)
+		self.objs.append(obj)
+		return len(self.records) - 1
+
+	def numbering(self, obj):
+		return self.index[id(obj)][1]
+
+	def graph(self, G):
+		vertices = list(G.vertices)
+		vertex_index = {v:i for i, v in enumerate(vertices)}
+		edges = []
+		for e in G.orientation:
+			edges += [e, G.bar(e)]
+		edge_index = {e:i for i, e in enumerate(edges)}
+
+		payload = bytearray()
+		_write_strings(payload, [v.label for v in vertices])
+		_write_ints(payload, array('i', [vertex_index[e.initial] for e in edges]))
+		_write_ints(payload, array('i', [vertex_index[e.terminal] for e in edges]))
+		_write_strings(payload, [e.label for e in edges])
+		return payload, (vertex_index, edge_index)
+
+	def complex(self, X):
+		G_record = self.add(X.G)
+		vertex_index, edge_index = self.numbering(X.G)
+		face_index = {face:i for i, face in enumerate(X.faces)}
+
+		payload = bytearray(struct.pack('<I', G_record))
+		_write_ints(payload, array('i', [len(face) for face in X.faces]))
+		_write_ints(payload, array('i', [edge_index[e] for face in X.faces for e in face]))
+		return payload, (vertex_index, edge_index, face_index)
+
+	def morphism(self, f):
+		domain_record = self.add(f.domain)
+		codomain_record = self.add(f.codomain)
+		domain_vertices, domain_edges, _ = self.numbering(f.domain)
+		vertex_index, edge_index, face_index = self.numbering(f.codomain)
+
+		vertices = sorted(domain_vertices, key = domain_vertices.get)
+		# The oriented edges are the even ones
+		edges = sorted(domain_edges, key = domain_edges.get)[::2]
+		face_maps = [f.face_maps[face] for face in f.domain.faces]
+
+		payload = bytearray(struct.pack('<II', domain_record, codomain_record))
+		_write_ints(payload, array('i', [vertex_index[f.f.f_V[v]] for v in vertices]))
+		_write_ints(payload, array('i', [edge_index[f.f.f_E[e]] for e in edges]))
+		_write_ints(payload, array('i', [face_index[fm.target] for fm in face_maps]))
+		_write_ints(payload, array('i', [fm.start_index for fm in face_maps]))
+		_write_ints(payload, array('i', [fm.orientation for fm in face_maps]))
+		_write_ints(payload, array('i', [fm.origin_start_index for fm in face_maps]))
+		return payload
+
+class Reader:
+	def __init__(self, data):
+		self.data = memoryview(data)
+		self.offset = 0
+
+	def read(self, length):
+		if self.offset + length > len(self.data):
+			raise Exception('Binary file is truncated.')
+		chunk = self.data[self.offset:self.offset + length]
+		self.offset += length
+		return bytes(chunk)
+
+	def unpack(self, fmt):
+		return struct.unpack(fmt, self.read(struct.calcsize(fmt)))
+
+	def ints(self):
+		count, = self.unpack('<I')
+		values = array('i')
+		values.frombytes(self.read(4*count))
+		if sys.byteorder == 'big':
+			values.byteswap()
+		return values
+
+	def strings(self):
+		count, length = self.unpack('<II')
+		if count == 0:
+			return []
+		return self.read(length).decode('utf-8').split('\0')
+
+def _write_ints(out, values):
+	out += struct.pack('<I', len(values))
+	if sys.byteorder == 'big':
+		values = array('i', values)
+		values.byteswap()
+	out += values.tobytes()
+
+# Labels are joined by null characters
+def _write_strings(out, strings):
+	data = '\0'.join(strings).encode('utf-8')
+	out += struct.pack('<II', len(strings), len(data))
+	out += data
+
+# Each loader returns the object with its vertices, edges and faces as lists in the order they are numbered in
+def _load_graph(reader):
+	vertices = [Vertex(label) for label in reader.strings()]
+	initial = reader.ints()
+	terminal = reader.ints()
+	edges = [Edge(vertices[i], vertices[j], label = label) for i, j, label in zip(initial, terminal, reader.strings())]
+
+	G = Graph([], [])
+	G.vertices = set(vertices)
+	G.edges = set(edges)
+	G.orientation = set(edges[::2])
+	G.bar_map = {}
+	G.incidence = {v:set() for v in vertices}
+	for k, e in enumerate(edges):
+		G.bar_map[e] = edges[k ^ 1]
+		G.incidence[e.initial].add(e)
+	return G, vertices, edges
+
+def _load_complex(reader, records):
+	G, vertices, edges = records[reader.unpack('<I')[0]]
+	lengths = reader.ints()
+	face_edges = reader.ints()
+
+	# Counts the faces in order as Complex.count_face does, which gives the free face bookkeeping as it was, reading
+	# the orientation off the edge numbers
+	X = Complex(G, [])
+	start = 0
+	for length in lengths:
+		indices = face_edges[start:start + length]
+		start += length
+		face = Face([edges[i] for i in indices])
+		X.faces.append(face)
+		for i in indices:
+			e = edges[i & ~1]
+			faces = X.edge_faces.get(e, ()) + (face,)
+			X.edge_faces[e] = faces
+			if len(faces) == 1:
+				X.free[e] = face
+			elif len(faces) == 2:
+				del X.free[e]
+
+	return X, vertices, edges, X.faces
+
+def _load_morphism(reader, records):
+	domain_record, codomain_record = reader.unpack('<II')
+	Y, Y_vertices, Y_edges, Y_faces = records[domain_record]
+	X, X_vertices, X_edges, X_faces = records[codomain_record]
+
+	f_V = SetFunction(zip(Y_vertices, (X_vertices[i] for i in reader.ints())))
+	# The bar of the edge numbered i is numbered i ^ 1
+	edge_images = {}
+	for k, i in enumerate(reader.ints()):
+		edge_images[Y_edges[2*k]] = X_edges[i]
+		edge_images[Y_edges[2*k + 1]] = X_edges[i ^ 1]
+	f_E = SetFunction(edge_images)
+	f = GraphMorphism(Y.G, X.G, f_V, f_E, trusted = True)
+
+	targets, start_indices, orientations, origin_start_indices = reader.ints(), reader.ints(), reader.ints(), reader.ints()
+	face_maps = SetFunction()
+	for i, face in enumerate(Y_faces):
+		face_maps[face] = FaceMap(face, X_faces[targets[i]], start_indices[i], orientations[i], origin_start_indices[i])
+
+	return (Morphism(Y, X, f, face_maps, trusted = True),)
@@ -0,0 +1,114 @@
+from cyclicword import canonical_rotation
+
+'''
+	Canonical forms of immersions f : Y -> X of complexes over a fixed codomain X.
+	Since f is an immersion, the edges leaving a vertex of Y are told apart by their images, so a breadth first
+	search from a chosen vertex, taking edges in the order of their images, numbers Y without any choices.
+	The canonical form is the least such numbering over all start vertices (per connected component), so two
+	immersions into X have the same canonical form exactly when they are isomorphic over X.
+	A face and its reverse, read along the bars of its edges with the opposite orientation, are the same 2-cell, so
+	each face is encoded by the least of its two readings.
+'''
+
+'''
+	The vertices and edges of X sorted by label, then by uid. When the labels are distinct, as for presentation
+	complexes, the order is the same whenever X is rebuilt, so canonical forms can be compared across processes.
+'''
+def codomain_order(X):
+	vertices = sorted(X.G.vertices, key = lambda v: (v.label, v.uid))
+	edges = sorted(X.G.edges, key = lambda e: (e.label, e.uid))
+	return vertices, edges
+
+'''
+	Ranks of the vertices, edges and faces of X, following codomain_order and the order of the faces.
+'''
+def codomain_ranks(X):
+	vertices, edges = codomain_order(X)
+	vertex_rank = {v:i for i, v in enumerate(vertices)}
+	edge_rank = {e:i for i, e in enumerate(edges)}
+	face_rank = {face:i for i, face in enumerate(X.faces)}
+	return vertex_rank, edge_rank, face_rank
+
+def canonical_form(f, ranks = None):
+	Y = f.domain
+	G = Y.G
+	if ranks == None:
+		ranks = codomain_ranks(f.codomain)
+	vertex_rank, edge_rank, face_rank = ranks
+
+	# Out edges at each vertex keyed by the rank of their image
+	out = {}
+	for v in G.vertices:
+		v_out = {}
+		for e in G.incidence[v]:
+			r = edge_rank[f.f.f_E[e]]
+			if r in v_out:
+				raise Exception('Canonical forms are only defined for immersions.')
+			v_out[r] = e
+		out[v] = sorted(v_out.items())
+
+	def local_key(v):
+		return (vertex_rank[f.f.f_V[v]], tuple(r for r, _ in out[v]))
+
+	def encode(start):
+		index = {start:0}
+		order = [start]
+		skeleton = []
+		for v in order:
+			adjacent = []
+			for r, e in out[v]:
+				w = e.terminal
+				if w not in index:
+					index[w] = len(order)
+					order.append(w)
+				adjacent.append((r, index[w]))
+			skeleton.append((vertex_rank[f.f.f_V[v]], tuple(adjacent)))
+		return index, tuple(skeleton)
+
+	def encode_face(face, index):
+		fm = f.face_maps[face]
+		forward = tuple((index[face[i].initial], edge_rank[f.f.f_E[face[i]]], fm.indice_map[i]) for i in range(len(face)))
+		# Edge i read backwards is the bar of face[i], from its terminal vertex, onto the same edge of the target
+		bars = [G.bar(e) for e in face]
+		backward = tuple((index[face[i].terminal], edge_rank[f.f.f_E[bars[i]]], fm.indice_map[i]) for i in reversed(range(len(face))))
+		target = face_rank[fm.target]
+		return min((target, fm.orientation, canonical_rotation(forward)), (target, -fm.orientation, canonical_rotation(backward)))
+
+	# Faces are grouped by the component containing their boundary
+	faces_at = {}
+	for face in Y.faces:
+		faces_at.setdefault(face[0].initial, []).append(face)
+
+	components = []
+	seen = set()
+	for v in G.vertices:
+		if v in seen:
+			continue
+		component, _ = encode(v)
+		seen.update(component)
+
+		# Only start vertices which look the same locally can give the least numbering
+		least = min(local_key(w) for w in component)
+		best = None
+		for start in component:
+			if local_key(start) != least:
+				continue
+			index, skeleton = encode(start)
+			faces = tuple(sorted(encode_face(face, index) for w in component for face in faces_at.get(w, [])))
+			if best == None or (skeleton, faces) < best:
+				best = (skeleton, faces)
+		components.append(best)
+
+	return tuple(sorted(components))
+
+'''
+	Checks if the immersions f1 and f2 into the same complex are isomorphic over it.
+'''
+def is_isomorphic(f1, f2):
+	if f1.codomain is not f2.codomain and f1.codomain != f2.codomain:
+		return False
+	if f1.domain.chi() != f2.domain.chi() or len(f1.domain.faces) != len(f2.domain.faces):
+		return False
+
+	ranks = codomain_ranks(f1.codomain)
+	return canonical_form(f1, ranks) == canonical_form(f2, ranks)
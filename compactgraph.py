@@ -0,0 +1,265 @@
+from array import array
+from graph import Graph
+from graph import Morphism as GraphMorphism
+from setfunction import SetFunction
+from labels import Edge, Vertex
+
+'''
+	Array backed graph with integer vertex ids 0..n-1 and edge ids 0..m-1.
+	Edges come in pairs: 2k is the k-th edge of the orientation and 2k + 1 is its bar.
+	Adjacency is stored CSR style, so the edges with initial vertex v are adjacency[offsets[v]:offsets[v + 1]].
+'''
+class CompactGraph:
+	def __init__(self, num_vertices, initial, terminal, vertex_labels = None, edge_labels = None):
+		self.n = num_vertices
+		self.initial = array('i', initial)
+		self.terminal = array('i', terminal)
+
+		if len(self.initial) != len(self.terminal) or len(self.initial) % 2 != 0:
+			raise Exception('Edges must be given in (edge, bar) pairs.')
+		for e in range(0, len(self.initial), 2):
+			if self.initial[e] != self.terminal[e + 1] or self.terminal[e] != self.initial[e + 1]:
+				raise Exception('Bar edges must reverse their partner.')
+
+		self.bar = array('i', [e ^ 1 for e in range(len(self.initial))])
+		self.vertex_labels = list(vertex_labels) if vertex_labels != None else [''] * self.n
+		self.edge_labels = list(edge_labels) if edge_labels != None else [''] * len(self.initial)
+
+		self.index_edges()
+
+	'''
+		Builds the CSR adjacency arrays with a counting sort on initial vertices.
+	'''
+	def index_edges(self):
+		offsets = array('i', [0]) * (self.n + 1)
+		for v in self.initial:
+			offsets[v + 1] += 1
+		for v in range(self.n):
+			offsets[v + 1] += offsets[v]
+
+		fill = array('i', offsets)
+		adjacency = array('i', [0]) * len(self.initial)
+		for e, v in enumerate(self.initial):
+			adjacency[fill[v]] = e
+			fill[v] += 1
+
+		self.offsets = offsets
+		self.adjacency = adjacency
+
+	def num_vertices(self):
+		return self.n
+
+	def num_edges(self):
+		return len(self.initial)
+
+	def chi(self):
+		return self.n - len(self.initial) // 2
+
+	def oriented(self, e):
+		return e & ~1
+
+	def matches_orientation(self, e):
+		return e & 1 == 0
+
+	# Returns the edges incident at v
+	def neighborhood(self, v):
+		return self.adjacency[self.offsets[v]:self.offsets[v + 1]]
+
+	def degree(self, v):
+		return self.offsets[v + 1] - self.offsets[v]
+
+	def __eq__(self, other):
+		if not isinstance(other, CompactGraph):
+			return False
+
+		return self.n == other.n and self.initial == other.initial and self.terminal == other.terminal
+
+	def __repr__(self):
+		return f'CompactGraph({self.n} vertices, {len(self.initial) // 2} edges)'
+
+	'''
+		Converts a Graph. Optionally include the lists of vertices and edges indexed by their ids.
+	'''
+	@staticmethod
+	def from_graph(G, include_maps = False):
+		vertices = list(G.vertices)
+		vertex_ids = {v:i for i, v in enumerate(vertices)}
+
+		edges = []
+		for e in G.orientation:
+			edges.append(e)
+			edges.append(G.bar(e))
+
+		initial = [vertex_ids[e.initial] for e in edges]
+		terminal = [vertex_ids[e.terminal] for e in edges]
+		cg = CompactGraph(len(vertices), initial, terminal, [v.label for v in vertices], [e.label for e in edges])
+
+		if not include_maps:
+			return cg
+		return cg, vertices, edges
+
+	'''
+		Converts back to a Graph with fresh labels. Optionally include the lists of vertices and edges indexed by their ids.
+	'''
+	def to_graph(self, include_maps = False):
+		vertices = [Vertex(label = label) for label in self.vertex_labels]
+		oriented = [Edge(vertices[self.initial[e]], vertices[self.terminal[e]], label = self.edge_labels[e]) for e in range(0, len(self.initial), 2)]
+
+		G = Graph(vertices, oriented, add_vertices_from_edges = False)
+
+		edges = []
+		for k, e in enumerate(oriented):
+			e_bar = G.bar(e)
+			e_bar.label = self.edge_labels[2*k + 1]
+			edges.append(e)
+			edges.append(e_bar)
+
+		if not include_maps:
+			return G
+		return G, vertices, edges
+
+'''
+	Morphism of compact graphs given by index arrays f_V and f_E.
+'''
+class CompactMorphism:
+	def __init__(self, domain, codomain, f_V, f_E):
+		self.domain = domain
+		self.codomain = codomain
+		self.f_V = array('i', f_V)
+		self.f_E = array('i', f_E)
+
+		if len(self.f_V) != domain.n or len(self.f_E) != domain.num_edges():
+			raise Exception('Index maps must be defined on every vertex and edge of the domain.')
+
+	def is_immersion(self):
+		domain = self.domain
+		offsets, adjacency, f_E = domain.offsets, domain.adjacency, self.f_E
+
+		# seen[e] is the last vertex at which the codomain edge e was hit
+		seen = array('i', [-1]) * self.codomain.num_edges()
+		for v in range(domain.n):
+			for k in range(offsets[v], offsets[v + 1]):
+				im = f_E[adjacency[k]]
+				if seen[im] == v:
+					return False
+				seen[im] = v
+
+		return True
+
+	'''
+		Returns the folded decomposition G -> G_fold, G_fold -> H as a pair of compact morphisms.
+		Same worklist and union-find scheme as folding.fold_graph_morphism, on integer ids.
+	'''
+	def fold(self):
+		G = self.domain
+		initial, terminal, f_E = G.initial, G.terminal, self.f_E
+		parent_V = list(range(G.n))
+		parent_E = list(range(G.num_edges()))
+
+		def find(parent, x):
+			while parent[x] != x:
+				parent[x] = parent[parent[x]]
+				x = parent[x]
+			return x
+
+		out = [{} for _ in range(G.n)]
+		pairs = []
+		for e in range(G.num_edges()):
+			v_out = out[initial[e]]
+			im = f_E[e]
+			if im in v_out:
+				pairs.append((v_out[im], e))
+			else:
+				v_out[im] = e
+
+		while len(pairs) > 0:
+			e1, e2 = pairs.pop()
+			r1 = find(parent_E, e1)
+			r2 = find(parent_E, e2)
+			if r1 == r2:
+				continue
+			parent_E[r2] = r1
+
+			v = find(parent_V, terminal[e1])
+			w = find(parent_V, terminal[e2])
+			if v == w:
+				continue
+			if len(out[v]) < len(out[w]):
+				v, w = w, v
+			parent_V[w] = v
+			large = out[v]
+			for im, e in out[w].items():
+				if im in large:
+					pairs.append((large[im], e))
+				else:
+					large[im] = e
+			out[w] = None
+
+		vertex_ids = array('i', [-1]) * G.n
+		vertex_labels = []
+		for v in range(G.n):
+			if parent_V[v] == v:
+				vertex_ids[v] = len(vertex_labels)
+				vertex_labels.append(G.vertex_labels[v])
+
+		edge_ids = array('i', [-1]) * G.num_edges()
+		roots = []
+		for e in range(0, G.num_edges(), 2):
+			r = find(parent_E, e)
+			r_bar = find(parent_E, e + 1)
+			if edge_ids[r] != -1 or edge_ids[r_bar] != -1:
+				continue
+			edge_ids[r] = len(roots)
+			edge_ids[r_bar] = len(roots) + 1
+			roots.append(r)
+			roots.append(r_bar)
+
+		fold_initial = [vertex_ids[find(parent_V, initial[r])] for r in roots]
+		fold_terminal = [vertex_ids[find(parent_V, terminal[r])] for r in roots]
+		G_fold = CompactGraph(len(vertex_labels), fold_initial, fold_terminal, vertex_labels, [G.edge_labels[r] for r in roots])
+
+		proj_V = [vertex_ids[find(parent_V, v)] for v in range(G.n)]
+		proj_E = [edge_ids[find(parent_E, e)] for e in range(G.num_edges())]
+		proj = CompactMorphism(G, G_fold, proj_V, proj_E)
+
+		g_V = [self.f_V[v] for v in range(G.n) if parent_V[v] == v]
+		g_E = [f_E[r] for r in roots]
+		g = CompactMorphism(G_fold, self.codomain, g_V, g_E)
+
+		return proj, g
+
+	'''
+		Converts a graph morphism. Optionally include the vertex/edge lists of the domain and codomain indexed by their ids.
+	'''
+	@staticmethod
+	def from_morphism(f, include_maps = False):
+		domain, domain_vertices, domain_edges = CompactGraph.from_graph(f.domain, include_maps = True)
+		codomain, codomain_vertices, codomain_edges = CompactGraph.from_graph(f.codomain, include_maps = True)
+
+		vertex_ids = {v:i for i, v in enumerate(codomain_vertices)}
+		edge_ids = {e:i for i, e in enumerate(codomain_edges)}
+		f_V = [vertex_ids[f.f_V[v]] for v in domain_vertices]
+		f_E = [edge_ids[f.f_E[e]] for e in domain_edges]
+
+		cf = CompactMorphism(domain, codomain, f_V, f_E)
+		if not include_maps:
+			return cf
+		return cf, domain_vertices, domain_edges, codomain_vertices, codomain_edges
+
+	'''
+		Converts back to a GraphMorphism. An existing codomain may be supplied together with its vertex/edge lists,
+		so that morphisms into a fixed graph are rebuilt against the same objects.
+	'''
+	def to_morphism(self, codomain = None, include_maps = False):
+		domain, domain_vertices, domain_edges = self.domain.to_graph(include_maps = True)
+		if codomain == None:
+			codomain = self.codomain.to_graph(include_maps = True)
+		codomain, codomain_vertices, codomain_edges = codomain
+
+		f_V = SetFunction({v:codomain_vertices[self.f_V[i]] for i, v in enumerate(domain_vertices)})
+		f_E = SetFunction({e:codomain_edges[self.f_E[i]] for i, e in enumerate(domain_edges)})
+
+		f = GraphMorphism(domain, codomain, f_V, f_E, trusted = True)
+		if not include_maps:
+			return f
+		return f, domain_vertices, domain_edges, codomain_vertices, codomain_edges
@@ -3,10 +3,12 @@ from graph import Morphism as GraphMorphism
 from setfunction import SetFunction
 from commongraphs import cycle, empty_graph
 from face import Face
+import verification
 
 class Complex:
 	'''
 		G should be 1-skeleton and faces should be a list of lists of edges representing the boundaries of faces.
+		Faces should be added with add_face, which keeps the free face bookkeeping up to date.
 	'''
 	def __init__(self, G, faces):
 		self.G = G
@@ -15,6 +17,32 @@ class Complex:
 		if not all(map(lambda face: face.mapsto(G), faces)):
 			raise Exception('All faces must map to 1-skeleton.')
 
+		# The faces running along each oriented edge, with multiplicity, and the free edges with their face.
+		# Tuples are never modified in place, so they may be shared with complexes derived from this one.
+		self.edge_faces = {}
+		self.free = {}
+		for face in faces:
+			self.count_face(face)
+
+		# Data derived from the complex by other modules, e.g. its disc diagrams, which lives as long as it does
+		self.cache = {}
+
+	def count_face(self, face):
+		for e in face:
+			e = self.G.oriented(e)
+			faces = self.edge_faces.get(e, ()) + (face,)
+			self.edge_faces[e] = faces
+			if len(faces) == 1:
+				self.free[e] = face
+			elif len(faces) == 2:
+				del self.free[e]
+
+	def add_face(self, face):
+		if not face.mapsto(self.G):
+			raise Exception('All faces must map to 1-skeleton.')
+
+		self.faces.append(face)
+		self.count_face(face)
 
 	def chi(self):
 		return self.G.chi() + len(self.faces)
@@ -24,7 +52,7 @@ class Complex:
 	@staticmethod
 	def construct_face_map(G, faces):
 		S = empty_graph()
-		w = GraphMorphism(S, G, SetFunction(), SetFunction())
+		w = GraphMorphism(S, G, SetFunction(), SetFunction(), trusted = True)
 		start_vertices = {}
 		for face in faces:
 			v0, f = face.face_map(G)
@@ -52,8 +80,8 @@ class Complex:
 		vertices = [e.initial for e in edges]
 		f_V = SetFunction({vertices[i]:fm.eval(X.G, i).initial for i in range(len(face))})
 		f_E = SetFunction({edges[i]:fm.eval(X.G, i) for i in range(len(face))})
-		f_skeleta = GraphMorphism(D.G, X.G, f_V, f_E)
-		f = Morphism(D, X, f_skeleta, face_maps)
+		f_skeleta = GraphMorphism(D.G, X.G, f_V, f_E, trusted = True)
+		f = Morphism(D, X, f_skeleta, face_maps, trusted = True)
 
 		return f
 
@@ -75,13 +103,20 @@ class Complex:
 
 	# Make a copy of a graph. Optionally include mappings between old/new vertex/edge sets
 	def copy(self, include_maps = False, maps_only = False, vertex_map = {}):
-		G, newV, newE = self.G.copy(include_maps = include_maps, maps_only = False, vertex_map = vertex_map)
+		G, newV, newE = self.G.copy(include_maps = True, vertex_map = vertex_map)
+		# Faces may run along bar edges too
+		for e in self.G.orientation:
+			newE[self.G.bar(e)] = G.bar(newE[e])
 		if maps_only:
 			return newV, newE
 
-		faces = [face.copy(edge_map = newE) for face in self.faces]
+		newF = {face:face.copy(edge_map = newE) for face in self.faces}
 
-		X = Complex(G, faces)
+		# Free face bookkeeping carries over along the edge map
+		X = Complex(G, [])
+		X.faces = [newF[face] for face in self.faces]
+		X.edge_faces = {newE[e]:tuple(newF[face] for face in faces) for e, faces in self.edge_faces.items()}
+		X.free = {newE[e]:newF[face] for e, face in self.free.items()}
 		if not include_maps:
 			return X
 		return X, newV, newE
@@ -105,8 +140,8 @@ class Complex:
 		face_maps1 = SetFunction({face:FaceMap(face, faces[i], 0, 1) for i, face in enumerate(X1.faces)})
 		face_maps2 = SetFunction({face:FaceMap(face, faces[i + len(X1.faces)], 0, 1) for i, face in enumerate(X2.faces)})
 
-		incl1 = Morphism(X1, X, incl1, face_maps1)
-		incl2 = Morphism(X2, X, incl2, face_maps2)
+		incl1 = Morphism(X1, X, incl1, face_maps1, trusted = True)
+		incl2 = Morphism(X2, X, incl2, face_maps2, trusted = True)
 
 		return X, incl1, incl2
 
@@ -114,26 +149,18 @@ class Complex:
 		Get the free faces of this complex.
 	'''
 	def free_faces(self, edges_only = False):
-		counts = {}
-		faces = {}
-		for face in self.faces:
-			for e in face:
-				e_canon = self.G.oriented(e)
-				counts[e_canon] = counts.get(e_canon, 0) + 1
-				faces[e_canon] = face
-
 		if edges_only:
-			return [e for e, c in counts.items() if c == 1]
-		return [(e, faces[e]) for e, c in counts.items() if c == 1]
+			return list(self.free.keys())
+		return list(self.free.items())
 
 	'''
 		Checks if edge is free face.
 	'''
 	def is_free_face(self, e):
-		return self.G.oriented(e) in map(lambda p: p[0], self.free_faces())
+		return self.G.oriented(e) in self.free
 
 	def has_free_faces(self):
-		return len(self.free_faces()) > 0
+		return len(self.free) > 0
 
 	'''
 		Gives a presentation of pi_1(self, v).
@@ -161,12 +188,18 @@ class Complex:
 	def __eq__(self, other):
 		if not isinstance(other, Complex):
 			return False
+		if self is other:
+			return True
 
 		return self.faces == other.faces and self.G == other.G
 
 	def __repr__(self):
 		return f'1-skeleton:\n{self.G}\nFaces: {self.faces}'
 
+	# Pickled as its skeleton and faces, the free face bookkeeping being rebuilt on load and the cache on demand
+	def __reduce__(self):
+		return (_unpickle_complex, (self.G, self.faces))
+
 	'''
 		Json serializes complex.
 	'''
@@ -258,7 +291,7 @@ class FaceMap:
 		return len(self.origin.face) // len(self.target.face)
 
 	def __hash__(self):
-		return hash(f'{self.origin}|{self.target}|{self.start_index}|{self.orientation}|{self.origin_start_index}')
+		return hash((self.origin, self.target, self.start_index, self.orientation, self.origin_start_index))
 
 	def __eq__(self, other):
 		if not isinstance(other, FaceMap):
@@ -270,6 +303,10 @@ class FaceMap:
 	def __repr__(self):
 		return f'{self.origin} {self.target} {self.start_index} {self.orientation}'
 
+	# The indice map is rebuilt on load
+	def __reduce__(self):
+		return (FaceMap, (self.origin, self.target, self.start_index, self.orientation, self.origin_start_index))
+
 	'''
 		Serialize to json.
 	'''
@@ -295,14 +332,19 @@ class FaceMap:
 '''
 	Morphism of complexes. f and s are graph morphisms between the 1-skeleta and attaching maps respectively.
 	Facemaps should be a set function
+	Trusted morphisms are built internally and only checked as far as the verification level asks for.
 '''
 class Morphism:
-	def __init__(self, domain, codomain, f, face_maps):
+	def __init__(self, domain, codomain, f, face_maps, trusted = False):
 		self.domain = domain
 		self.codomain = codomain
 		self.f = f
 		self.face_maps = face_maps
 
+		checks = verification.checks(trusted)
+		if checks == verification.OFF:
+			return
+
 		# Basic checks
 		if face_maps.domain != set(domain.faces):
 			raise Exception('Face map was not given for each face in domain.')
@@ -316,6 +358,9 @@ class Morphism:
 		if not all(map(lambda p: p[0] == p[1].origin, face_maps.items())):
 			raise Exception('Face maps must be indexed by their origin face.')
 
+		if checks < verification.FULL:
+			return
+
 		# Commutivity of facemaps with skeleta map
 		for facemap in self.face_maps.values():
 			for i in range(len(facemap.origin)):
@@ -351,7 +396,7 @@ class Morphism:
 		for e in X2.G.edges:
 			f_E[incl2.f.f_E[e]] = f2.f.f_E[e]
 
-		f_skeleta = GraphMorphism(X.G, f1.codomain.G, f_V, f_E)
+		f_skeleta = GraphMorphism(X.G, f1.codomain.G, f_V, f_E, trusted = True)
 
 		face_maps = SetFunction()
 		for face in X1.faces:
@@ -363,7 +408,7 @@ class Morphism:
 			fm = f2.face_maps[face]
 			face_maps[wedge_face] = FaceMap(wedge_face, fm.target, fm.start_index, fm.orientation)
 
-		f = Morphism(X, f1.codomain, f_skeleta, face_maps)
+		f = Morphism(X, f1.codomain, f_skeleta, face_maps, trusted = True)
 		if not include_maps:
 			return f
 		return f, incl1, incl2
@@ -396,6 +441,10 @@ class Morphism:
 
 		return self.domain == other.domain and self.codomain == other.codomain and self.f == other.f and self.face_maps == other.face_maps
 
+	# Face maps are indexed by their origin, so only the face maps themselves are pickled
+	def __reduce__(self):
+		return (_unpickle_morphism, (self.domain, self.codomain, self.f, list(self.face_maps.values())))
+
 	# The composite f circ g
 	@staticmethod
 	def compose(f, g):
@@ -405,12 +454,12 @@ class Morphism:
 		face_maps = SetFunction()
 		for face, g_map in g.face_maps.items():
 			face_maps[face] = FaceMap.compose(f.face_maps[g_map.target], g_map)
-		return Morphism(g.domain, f.codomain, GraphMorphism.compose(f.f, g.f), face_maps)
+		return Morphism(g.domain, f.codomain, GraphMorphism.compose(f.f, g.f), face_maps, trusted = True)
 
 	@staticmethod
 	def identity(X):
 		face_maps = SetFunction({f:FaceMap(f, f, 0, 1) for f in X.faces})
-		return Morphism(X, X, GraphMorphism.identity(X.G), face_maps)
+		return Morphism(X, X, GraphMorphism.identity(X.G), face_maps, trusted = True)
 
 
 	'''
@@ -441,6 +490,15 @@ class Morphism:
 
 		face_maps = SetFunction({fm.origin:fm for fm in face_maps})
 
-		return Morphism(Y, X, f, face_maps)
+		return Morphism(Y, X, f, face_maps, trusted = True)
 
+# The faces are counted in order, so the free face bookkeeping comes out as it was
+def _unpickle_complex(G, faces):
+	X = Complex(G, [])
+	for face in faces:
+		X.faces.append(face)
+		X.count_face(face)
+	return X
 
+def _unpickle_morphism(domain, codomain, f, face_maps):
+	return Morphism(domain, codomain, f, SetFunction({fm.origin:fm for fm in face_maps}), trusted = True)
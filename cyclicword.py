@@ -0,0 +1,117 @@
+'''
+	Utilities for sequences considered up to cyclic rotation, and optionally up to reversing their orientation,
+	such as relator words and face boundaries. Elements are compared through an optional key function.
+'''
+
+def _keys(seq, key = None):
+	if key == None:
+		return list(seq)
+	return [key(x) for x in seq]
+
+'''
+	Returns the index k such that seq[k:] + seq[:k] is the lexicographically least rotation of seq,
+	computed in linear time with Booth's algorithm.
+'''
+def least_rotation(seq, key = None):
+	s = _keys(seq, key)
+	n = len(s)
+	if n == 0:
+		return 0
+
+	s = s + s
+	f = [-1] * len(s)
+	k = 0
+	for j in range(1, len(s)):
+		sj = s[j]
+		i = f[j - k - 1]
+		while i != -1 and sj != s[k + i + 1]:
+			if sj < s[k + i + 1]:
+				k = j - i - 1
+			i = f[i]
+		if sj != s[k + i + 1]:
+			# Here i == -1
+			if sj < s[k]:
+				k = j
+			f[j - k] = -1
+		else:
+			f[j - k] = i + 1
+
+	return k % n
+
+'''
+	Returns the least p such that rotating seq by p gives seq back.
+'''
+def least_period(seq, key = None):
+	s = _keys(seq, key)
+	n = len(s)
+	if n == 0:
+		return 0
+
+	# Prefix function
+	pi = [0] * n
+	for i in range(1, n):
+		j = pi[i - 1]
+		while j > 0 and s[i] != s[j]:
+			j = pi[j - 1]
+		if s[i] == s[j]:
+			j += 1
+		pi[i] = j
+
+	p = n - pi[-1]
+	return p if n % p == 0 else n
+
+def rotate(seq, k):
+	if len(seq) == 0:
+		return seq
+	k %= len(seq)
+	return seq[k:] + seq[:k]
+
+'''
+	The least rotation of seq, of the same type as seq.
+'''
+def canonical_rotation(seq, key = None):
+	return rotate(seq, least_rotation(seq, key))
+
+'''
+	Hashable key which agrees for two sequences exactly when they are equal up to rotation.
+	If reverse is given, it should map the tuple of keys to the keys read in the opposite orientation (e.g. the
+	inverse of a word), and the key then also agrees on sequences equal up to rotation and reversal.
+'''
+def cyclic_key(seq, key = None, reverse = None):
+	s = tuple(_keys(seq, key))
+	forward = canonical_rotation(s)
+	if reverse == None:
+		return forward
+
+	backward = canonical_rotation(tuple(reverse(s)))
+	return min(forward, backward)
+
+def cyclically_equal(w1, w2, key = None):
+	if len(w1) != len(w2):
+		return False
+	return canonical_rotation(tuple(_keys(w1, key))) == canonical_rotation(tuple(_keys(w2, key)))
+
+'''
+	Returns the least offset o such that s1[i] == s2[(i + o) % n] for all i, or -1 if there is none.
+'''
+def rotation_offset(s1, s2, key = None):
+	k1 = _keys(s1, key)
+	k2 = _keys(s2, key)
+	n = len(k1)
+	if n != len(k2):
+		return -1
+	if n == 0:
+		return 0
+
+	r1 = least_rotation(k1)
+	r2 = least_rotation(k2)
+	if rotate(k1, r1) != rotate(k2, r2):
+		return -1
+
+	return (r2 - r1) % least_period(k2)
+
+'''
+	Inverse of a word written with capitals for inverse generators, e.g. abAB -> baBA.
+'''
+def inverse_word(w):
+	return w[::-1].swapcase()
@@ -0,0 +1,132 @@
+from facialtree import get_children, disc_diagrams
+from folding import fold_complex_morphism
+from canonical import canonical_form, codomain_order, codomain_ranks
+import parallel
+import os
+import time
+
+'''
+	Exhaustive enumeration of the facial tree of X down to a given depth, level by level.
+	Level 0 holds the folded disc diagrams of X, and level d + 1 the facial strict children of level d. Pieces are
+	counted once per isomorphism class over X, through a transposition table of canonical forms.
+
+	If a checkpoint file is given, the state is written to it every checkpoint_every seconds and after each level,
+	and run picks up from it if it exists. Pieces are saved relative to the vertices, edges and faces of X, which are
+	matched up by label on resuming, so X must have distinct labels and be rebuilt the same way (e.g. from the same
+	presentation).
+'''
+class Enumeration:
+	# Version 2 keys faces up to orientation, so the transposition tables of earlier checkpoints do not match
+	version = 2
+
+	def __init__(self, X, depth, checkpoint = None, checkpoint_every = 600, check_npi = None, pool = None, verbose = False):
+		self.X = X
+		self.depth = depth
+		self.checkpoint = checkpoint
+		self.checkpoint_every = checkpoint_every
+		self.check_npi = check_npi
+		self.pool = pool
+		self.verbose = verbose
+		self.ranks = codomain_ranks(X)
+
+		self.level = 0
+		self.frontier = []
+		self.next_level = []
+		self.seen = set()
+		# Number of pieces at each level
+		self.counts = []
+
+	def add(self, piece):
+		key = canonical_form(piece, self.ranks)
+		if key in self.seen:
+			return False
+		self.seen.add(key)
+		self.next_level.append(piece)
+		return True
+
+	'''
+		Enumerates down to the depth and returns the number of pieces at each level.
+	'''
+	def run(self):
+		if self.checkpoint != None and os.path.exists(self.checkpoint):
+			self.load()
+		elif len(self.counts) == 0:
+			for _, _, f, _ in disc_diagrams(self.X):
+				self.add(fold_complex_morphism(f, include_proj = False))
+			self.end_level()
+
+		last_save = time.time()
+		while self.level < self.depth:
+			while len(self.frontier) > 0:
+				children = get_children(self.X, self.frontier[-1], check_npi = self.check_npi, unique = True, pool = self.pool)
+				self.frontier.pop()
+				for child in children:
+					self.add(child)
+
+				if self.checkpoint != None and time.time() - last_save > self.checkpoint_every:
+					self.save()
+					last_save = time.time()
+
+			self.level += 1
+			self.end_level()
+			if self.checkpoint != None:
+				self.save()
+				last_save = time.time()
+
+		return self.counts
+
+	def end_level(self):
+		self.counts.append(len(self.next_level))
+		if self.verbose:
+			print(f'Depth {len(self.counts) - 1}: {self.counts[-1]} pieces')
+		self.frontier = self.next_level
+		self.next_level = []
+
+	'''
+		X with its vertices, edges and faces in an order which is the same whenever X is rebuilt the same way.
+	'''
+	def context(self):
+		vertices, edges = codomain_order(self.X)
+		return [self.X, self.X.G] + vertices + edges + list(self.X.faces)
+
+	# Labels of X read in context order, to tell if a checkpoint was made for the same complex
+	def signature(self):
+		vertices, edges = codomain_order(self.X)
+		return [v.label for v in vertices], [e.label for e in edges], [[e.label for e in face] for face in self.X.faces]
+
+	def save(self):
+		vertices, edges = codomain_order(self.X)
+		if len(set(v.label for v in vertices)) != len(vertices) or len(set(e.label for e in edges)) != len(edges):
+			raise Exception('Checkpoints need the vertices and edges of X to have distinct labels.')
+
+		state = {
+			'version': Enumeration.version,
+			'signature': self.signature(),
+			'depth': self.depth,
+			'level': self.level,
+			'counts': self.counts,
+			'seen': self.seen,
+			'frontier': self.frontier,
+			'next_level': self.next_level,
+		}
+
+		# Written aside and moved into place, so an interrupted save leaves the previous checkpoint intact
+		tmp = self.checkpoint + '.tmp'
+		with open(tmp, 'wb') as f:
+			f.write(parallel.dumps(state, self.context()))
+		os.replace(tmp, self.checkpoint)
+
+	def load(self):
+		with open(self.checkpoint, 'rb') as f:
+			state = parallel.loads(f.read(), self.context())
+
+		if state['version'] != Enumeration.version:
+			raise Exception(f'Checkpoint has version {state["version"]}, expected {Enumeration.version}.')
+		if state['signature'] != self.signature():
+			raise Exception('Checkpoint was made for a different complex.')
+
+		self.level = state['level']
+		self.counts = state['counts']
+		self.seen = state['seen']
+		self.frontier = state['frontier']
+		self.next_level = state['next_level']
@@ -1,8 +1,10 @@
 from commongraphs import cycle
 from setfunction import SetFunction
 from graph import Morphism
+from cyclicword import cyclic_key, least_period, rotation_offset
 
 class Face:
+	__slots__ = ('face', 'uid')
 	counter = 0
 	def __init__(self, face):
 		self.face = face
@@ -28,30 +30,38 @@ class Face:
 			v_curr = e_curr.terminal
 			e_curr = next(iter(C.out_edges(v_curr)))
 
-		return v0, Morphism(C, G, f_V, f_E)
+		return v0, Morphism(C, G, f_V, f_E, trusted = True)
 
 	'''
 		Checks if two faces are equal up to cycling their elements and orientation.
 		Returns the positive index offset s.t. f1[i] = f2[orientation * i + offset] for all i if true, else -1.
+		Of the valid offsets the least is returned, preferring orientation 1 on ties.
 	'''
 	@staticmethod
 	def offset_equal(f1, f2):
-		if len(f1.face) != len(f2.face):
+		n = len(f1.face)
+		if n != len(f2.face) or n == 0:
 			return -1, 0
 
-		for offset in range(len(f1.face)):
-			for orientation in [1, -1]:
-				worked = True
-				for i in range(len(f1.face)):
-					ind = i + offset if orientation == 1 else (-1 - i) + offset
-					ind = ind % len(f2.face)
-					if f1.face[i] != f2.face[ind]:
-						worked = False
-						break
-				if worked:
-					return offset, orientation
+		uid = lambda e: e.uid
+		forward = rotation_offset(f1.face, f2.face, key = uid)
+		# Reading f2 backwards, f1[i] = f2[-1 - i + offset] for offsets in a coset of the period of f2
+		backward = rotation_offset(f1.face, f2.face[::-1], key = uid)
+		if backward != -1:
+			backward = -backward % least_period(f2.face, key = uid)
+
+		if forward != -1 and (backward == -1 or forward <= backward):
+			return forward, 1
+		if backward != -1:
+			return backward, -1
 		return -1, 0
 
+	'''
+		Hashable key agreeing on faces which are offset_equal, so faces can be compared and looked up in one pass.
+	'''
+	def cyclic_key(self):
+		return cyclic_key(self.face, key = lambda e: e.uid, reverse = lambda s: s[::-1])
+
 	def copy(self, edge_map = {}, vertex_map = {}):
 		return Face([edge_map.get(e, e.copy(vertex_map = vertex_map)) for e in self.face])
 
@@ -74,7 +84,11 @@ class Face:
 		return self.uid == other.uid
 
 	def __hash__(self):
-		return hash(f'Face{self.uid}')
+		return self.uid
+
+	# As for labels, unpickled faces get a fresh uid
+	def __reduce__(self):
+		return (Face, (self.face,))
 
 	def __repr__(self):
 		return self.face.__repr__()
@@ -1,40 +1,122 @@
 from complex import Complex, Morphism as ComplexMorphism
-from folding import fold_complex_morphism
+from folding import fold_complex_morphism, fold_attached
+from canonical import canonical_form, codomain_ranks
 import itertools
+import parallel
+import random
 from tqdm import tqdm
 
 '''
 	Optionally include maps to give the canonical map parent -> child
+	Attachments of a disc along a face the piece already has at that vertex are skipped without folding, as they give
+	back the piece; in particular check_npi is not called on these copies of the piece.
+	If unique is True, only the first child in each isomorphism class over X is returned.
+	If a multiprocessing pool is given, the wedged folds are spread over it. The children, and the calls to check_npi,
+	come in the same order as without it.
 '''
-def get_children(X, piece, include_maps = False, check_npi = None):
+def get_children(X, piece, include_maps = False, check_npi = None, unique = False, pool = None):
+	return list(iter_children(X, piece, include_maps = include_maps, check_npi = check_npi, unique = unique, pool = pool))
+
+'''
+	Generator version of get_children, which only folds a candidate once the previous child has been consumed.
+'''
+def iter_children(X, piece, include_maps = False, check_npi = None, unique = False, pool = None):
+	candidates = child_candidates(X, piece, include_maps = include_maps)
+	if pool == None:
+		folds = (_wedged_fold(None, candidate) for candidate in candidates)
+	else:
+		discs = [f for _, _, f, _ in disc_diagrams(X)]
+		folds = parallel.imap(pool, _wedged_fold, parallel.context_objects(piece, *discs), candidates)
+
+	ranks = codomain_ranks(X)
+	seen = set()
+	for data in folds:
+		if not is_strict_child(piece, data, include_maps = include_maps, check_npi = check_npi):
+			continue
+
+		if unique:
+			key = canonical_form(data if not include_maps else data[0], ranks)
+			if key in seen:
+				continue
+			seen.add(key)
+
+		yield data
+
+'''
+	A uniformly random child of the piece, as random.choice(get_children(X, piece)) would give, or None if it has none.
+	The candidates are folded in a random order until the first facially strict one, so check_npi only sees those.
+	For a uniform choice which still folds (and checks) every child, use reservoir_sample(iter_children(X, piece)).
+'''
+def random_child(X, piece, include_maps = False, check_npi = None, rng = random):
+	candidates = child_candidates(X, piece, include_maps = include_maps)
+	rng.shuffle(candidates)
+	for candidate in candidates:
+		data = _wedged_fold(None, candidate)
+		if is_strict_child(piece, data, include_maps = include_maps, check_npi = check_npi):
+			return data
+
+	return None
+
+'''
+	Uniformly random element of an iterable of unknown length, consuming it once, or None if it is empty.
+'''
+def reservoir_sample(iterable, rng = random):
+	sample = None
+	for n, item in enumerate(iterable):
+		if rng.randrange(n + 1) == 0:
+			sample = item
+	return sample
+
+'''
+	The (piece, v1, disc, v2, include_maps) attachments which get_children folds, in order.
+'''
+def child_candidates(X, piece, include_maps = False):
 	vertices = piece.domain.G.vertices
 	image_sorted = image_sort(vertices, piece.f.f_V)
 	piece_im = set(image_sorted.keys())
 
-	children = []
-	for face, orientation in itertools.product(X.faces, [1, -1]):
-		f = Complex.disc_diagram(X, face, orientation)
-		disc_image_sorted = image_sort(f.domain.G.vertices, f.f.f_V)
+	positions = face_positions(piece)
+	candidates = []
+	for face, orientation, f, disc_image_sorted in disc_diagrams(X):
+		disc_positions = {v:index for v, _, index in face_positions(f)}
 		shared = set(disc_image_sorted.keys()).intersection(piece_im)
 		for im in shared:
 			for v1, v2 in itertools.product(image_sorted[im], disc_image_sorted[im]):
-				data = wedged_fold(piece, v1, f, v2, include_maps = include_maps)
-				imm = data if not include_maps else data[0]
+				# The boundary of the disc would lift onto that of a face of the piece through v1, so the disc folds
+				# onto that face and the child is the piece itself, which is not facially strict
+				if (v1, face, disc_positions[v2]) in positions:
+					continue
+				candidates.append((piece, v1, f, v2, include_maps))
 
-				if check_npi != None:
-					check_npi(imm)
+	return candidates
 
-				# Is facial strict
-				if len(imm.domain.faces) == len(piece.domain.faces) + 1:
-					children.append(data)
+# Runs check_npi on a folded attachment and tells if it is a facially strict child
+def is_strict_child(piece, data, include_maps = False, check_npi = None):
+	imm = data if not include_maps else data[0]
+	if check_npi != None:
+		check_npi(imm)
 
-	return children
+	return len(imm.domain.faces) == len(piece.domain.faces) + 1
+
+'''
+	The set of (vertex, target face, target vertex index) at which the faces of the immersion f pass through the
+	vertices of its domain.
+'''
+def face_positions(f):
+	positions = set()
+	for face in f.domain.faces:
+		fm = f.face_maps[face]
+		for i in range(len(face)):
+			positions.add((face[i].initial, fm.target, fm.initial(i)))
+	return positions
+
+def _wedged_fold(context, candidate):
+	f1, v1, f2, v2, include_maps = candidate
+	return wedged_fold(f1, v1, f2, v2, include_maps = include_maps)
 
 def get_children_at_vertex(X, piece, v, include_maps = False):
 	children = []
-	for face, orientation in itertools.product(X.faces, [1, -1]):
-		f = Complex.disc_diagram(X, face, orientation)
-		disc_image_sorted = image_sort(f.domain.G.vertices, f.f.f_V)
+	for face, orientation, f, disc_image_sorted in disc_diagrams(X):
 		for v2 in disc_image_sorted.get(piece.f.f_V[v], []):
 			data = wedged_fold(piece, v, f, v2, include_maps = include_maps)
 			imm = data if not include_maps else data[0]
@@ -45,15 +127,35 @@ def get_children_at_vertex(X, piece, v, include_maps = False):
 	return children
 
 def wedged_fold(f1, v1, f2, v2, include_maps = False):
-	g, incl, _ = ComplexMorphism.wedge(f1, v1, f2, v2, include_maps = True)
-	proj, imm = fold_complex_morphism(g)
-	
-	data = imm
-	if include_maps:
-		proj = ComplexMorphism.compose(proj, incl)
-		data = imm, proj
-	
-	return data
+	# Pieces are folded, so only the folds spreading from the wedge point need to be made
+	return fold_attached(f1, v1, f2, v2, include_maps = include_maps)
+
+'''
+	The disc diagrams of X as a list of (face, orientation, disc, image_sorted) over the faces and orientations of X,
+	where image_sorted is image_sort of the vertices of the disc.
+	They are built once and kept in X.cache, so they live as long as X and are shared; they must not be modified.
+'''
+def disc_diagrams(X):
+	cached = X.cache.get('disc_diagrams')
+	if cached != None and cached[0] == len(X.faces):
+		return cached[1]
+
+	discs = []
+	for face, orientation in itertools.product(X.faces, [1, -1]):
+		f = Complex.disc_diagram(X, face, orientation)
+		discs.append((face, orientation, f, image_sort(f.domain.G.vertices, f.f.f_V)))
+
+	X.cache['disc_diagrams'] = (len(X.faces), discs)
+	return discs
+
+'''
+	The disc diagram of the given face of X with the given orientation, from the cache of disc_diagrams.
+'''
+def disc_diagram(X, face, orientation = 1):
+	for disc_face, disc_orientation, f, _ in disc_diagrams(X):
+		if disc_face is face and disc_orientation == orientation:
+			return f
+	raise Exception('Face must be a face of the complex.')
 
 def image_sort(domain, func):
 	image_sorted = {}
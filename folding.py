@@ -1,4 +1,3 @@
-import itertools
 from graph import Graph
 from graph import Morphism as GraphMorphism
 from setfunction import SetFunction
@@ -10,12 +9,13 @@ from labels import *
 '''
 	Returns the folded decomposition A -> C, C -> B of the complex morphism f : A -> B
 	Rational curvature invariants for 2-complexes (Lemma 2.6)
+	If include_proj is False only the immersion C -> B is built and returned.
 '''
-def fold_complex_morphism(f):
+def fold_complex_morphism(f, include_proj = True):
 	A = f.domain
 	B = f.codomain
 
-	proj, g = fold_graph_morphism(f.f)
+	log, g = fold_graph_morphism(f.f, lazy = True)
 	C_skeleton = g.domain
 
 	vertex_to_indice = {}
@@ -23,28 +23,23 @@ def fold_complex_morphism(f):
 	C_B_face_maps = {}
 	A_C_face_maps = {}
 	vertices = set()
-	edges = set()
 	for face, fm in f.face_maps.items():
 		ind = 0
 		C_face = []
 		for i in range(len(face)):
-			Y_fold_im = proj.f_E[face[i]]
+			Y_fold_im = log.edge_map[face[i]]
 
 			initial_vertex = (Y_fold_im.initial, (fm.target, fm.initial(i)))
-			terminal_vertex = (Y_fold_im.terminal, (fm.target, fm.terminal(i)))
 			# Already accounted for this cycle in the image, or have reached start
 			if initial_vertex in vertices:
 				break
 
-			e = Edge(initial_vertex, terminal_vertex)
 			if initial_vertex not in vertex_to_indice:
 				vertex_to_indice[initial_vertex] = (ind, len(C_faces), fm.orientation)
 				ind += 1
 
 			C_face.append(Y_fold_im)
 
-			edges.add(e)
-
 			# Only add initial vertex at each step
 			vertices.add(initial_vertex)
 
@@ -53,8 +48,11 @@ def fold_complex_morphism(f):
 			C_faces.append(C_face)
 			C_B_face_maps[C_face] = FaceMap(C_face, fm.target, fm.start_index, fm.orientation, origin_start_index = fm.origin_start_index)
 
+		if not include_proj:
+			continue
+
 		# Populate projection face
-		Y_fold_im = proj.f_E[face[0]]
+		Y_fold_im = log.edge_map[face[0]]
 
 		# This is very scuffed way to determine A -> C face maps
 		initial_vertex = (Y_fold_im.initial, (fm.target, fm.initial(0)))
@@ -63,41 +61,457 @@ def fold_complex_morphism(f):
 		A_C_face_maps[face] = FaceMap(face, C_faces[f_ind], ind, fm.orientation * orient)
 
 	C_B_face_maps = SetFunction(C_B_face_maps)
-	A_C_face_maps = SetFunction(A_C_face_maps)
 
 	C = Complex(C_skeleton, C_faces)
 
-	imm = ComplexMorphism(C, B, g, C_B_face_maps)
-	proj = ComplexMorphism(A, C, proj, A_C_face_maps)
+	imm = ComplexMorphism(C, B, g, C_B_face_maps, trusted = True)
+	if not include_proj:
+		return imm
+
+	A_C_face_maps = SetFunction(A_C_face_maps)
+	proj = ComplexMorphism(A, C, log.projection(), A_C_face_maps, trusted = True)
 
 	return proj, imm
 
 
 '''
-	Returns the decomposition G -> G_fold, G_fold -> H of the graph morphism f : G -> H
+	Folds the wedge of f1 : Y -> X and f2 : D -> X at v1 ~ v2, returning the immersion C -> X and, with include_maps,
+	the map Y -> C, as folding ComplexMorphism.wedge(f1, v1, f2, v2) would.
+	f1 must already be folded (e.g. an output of fold_complex_morphism) while D, typically a disc, may be arbitrary.
+	Folds are propagated outwards from the wedge point only, and C shares every vertex, edge and face of Y which is not
+	identified with something else, so the folding work scales with D and the part of Y it folds onto.
 '''
-def fold_graph_morphism(f):
-	proj = GraphMorphism.identity(f.domain)
-	while True:
-		folded = False
-
-		G = f.domain
-		for v in G.vertices:
-			for e1, e2 in itertools.product(G.neighborhood(v), repeat = 2):
-				if e1 == e2:
-					continue
-				if f.f_E[e1] == f.f_E[e2]:
-					folded = True
-					_proj, f = fold_admissible_pair(f, e1, e2)
-					proj = GraphMorphism.compose(_proj, proj)
-					break
-			if folded:
+def fold_attached(f1, v1, f2, v2, include_maps = False):
+	Y = f1.domain
+	D = f2.domain
+	X = f1.codomain
+	if v1 not in Y.G.vertices or v2 not in D.G.vertices:
+		raise Exception('Vertices must belong to respective domains to form wedge of morphisms.')
+	if f1.f.f_V[v1] != f2.f.f_V[v2]:
+		raise Exception('Morphisms must agree at wedge vertices to factor through wedge.')
+	if X != f2.codomain:
+		raise Exception('Morphisms must have the same codomoin to factor through wedge.')
+
+	# D must be disjoint from Y, which it is not when Y grew out of this very disc diagram, since folding an immersion
+	# gives it back as it is
+	if not Y.G.vertices.isdisjoint(D.G.vertices):
+		D_copy, newV, newE = D.copy(include_maps = True)
+		f_V = SetFunction({newV[v]:f2.f.f_V[v] for v in D.G.vertices})
+		f_E = SetFunction({newE[e]:f2.f.f_E[e] for e in D.G.edges})
+		face_maps = SetFunction()
+		for face, new_face in zip(D.faces, D_copy.faces):
+			fm = f2.face_maps[face]
+			face_maps[new_face] = FaceMap(new_face, fm.target, fm.start_index, fm.orientation, origin_start_index = fm.origin_start_index)
+		f2 = ComplexMorphism(D_copy, X, GraphMorphism(D_copy.G, X.G, f_V, f_E, trusted = True), face_maps, trusted = True)
+		v2 = newV[v2]
+		D = D_copy
+
+	Y_G = Y.G
+	D_G = D.G
+
+	def vertex_image(v):
+		im = f1.f.f_V.get(v)
+		return im if im != None else f2.f.f_V[v]
+
+	def edge_image(e):
+		im = f1.f.f_E.get(e)
+		return im if im != None else f2.f.f_E[e]
+
+	def bar(e):
+		e_bar = Y_G.bar_map.get(e)
+		return e_bar if e_bar != None else D_G.bar_map[e]
+
+	vertices = UnionFind()
+	edges = UnionFind()
+	out = {}
+	pairs = []
+
+	# Out edge tables are only built for the vertices of Y reached by the folding
+	def table(v):
+		v_out = out.get(v)
+		if v_out == None:
+			v_out = {}
+			incident = Y_G.incidence.get(v)
+			if incident == None:
+				incident = D_G.incidence[v]
+			for e in incident:
+				im = edge_image(e)
+				if im in v_out:
+					pairs.append((v_out[im], e))
+				else:
+					v_out[im] = e
+			out[v] = v_out
+		return v_out
+
+	def identify(v, w):
+		v = vertices.find(v)
+		w = vertices.find(w)
+		if v == w:
+			return
+		table(v)
+		table(w)
+		root, absorbed = vertices.union(v, w)
+		small = out.pop(absorbed)
+		large = out[root]
+		if len(small) > len(large):
+			small, large = large, small
+		out[root] = large
+		for im, e in small.items():
+			if im in large:
+				pairs.append((large[im], e))
+			else:
+				large[im] = e
+
+	for v in D_G.vertices:
+		table(v)
+	identify(v1, v2)
+	while len(pairs) > 0:
+		e1, e2 = pairs.pop()
+		if edges.union(e1, e2) is None:
+			continue
+		identify(e1.terminal, e2.terminal)
+
+	# Each vertex class keeps a vertex of Y if it has one, otherwise gets a copy
+	vertex_classes = {}
+	for v in set(vertices.parent) | set(vertices.size) | D_G.vertices:
+		vertex_classes.setdefault(vertices.find(v), []).append(v)
+
+	vertex_map = {}
+	new_vertices = []
+	removed_vertices = []
+	for r, members in vertex_classes.items():
+		kept = [v for v in members if v in Y_G.vertices]
+		if len(kept) > 0:
+			rep = kept[0]
+			removed_vertices += kept[1:]
+		else:
+			rep = r.copy()
+			new_vertices.append(rep)
+		for v in members:
+			vertex_map[v] = rep
+
+	# Edges of Y at removed vertices must be replaced, even if nothing was folded onto them
+	touched_edges = set(edges.parent) | set(edges.size) | D_G.edges
+	for w in removed_vertices:
+		for e in Y_G.incidence[w]:
+			touched_edges.add(e)
+			touched_edges.add(Y_G.bar(e))
+
+	edge_classes = {}
+	for e in touched_edges:
+		edge_classes.setdefault(edges.find(e), []).append(e)
+
+	def is_oriented(e):
+		return e in Y_G.orientation or e in D_G.orientation
+
+	def is_kept(e):
+		return vertex_map.get(e.initial, e.initial) is e.initial and vertex_map.get(e.terminal, e.terminal) is e.terminal
+
+	# Each pair of classes {c, bar c} keeps an edge of Y (with its bar) if one still has its endpoints, otherwise
+	# gets a new edge
+	edge_map = {}
+	new_edges = []
+	removed_edges = []
+	for r, members in edge_classes.items():
+		if r in edge_map:
+			continue
+		bar_members = edge_classes[edges.find(bar(members[0]))]
+		if not any(is_oriented(e) for e in members):
+			members, bar_members = bar_members, members
+
+		rep = next((e for e in members + bar_members if e in Y_G.orientation and is_kept(e)), None)
+		if rep == None:
+			base = next(e for e in members if is_oriented(e))
+			rep = Edge(vertex_map.get(base.initial, base.initial), vertex_map.get(base.terminal, base.terminal), label = base.label)
+			rep_bar = rep.bar()
+			new_edges.append((rep, rep_bar))
+		else:
+			rep_bar = Y_G.bar(rep)
+			if rep in bar_members:
+				members, bar_members = bar_members, members
+
+		for e in members:
+			edge_map[e] = rep
+		for e in bar_members:
+			edge_map[e] = rep_bar
+		removed_edges += [e for e in members + bar_members if e in Y_G.edges and e is not rep and e is not rep_bar]
+
+	C_G = Y_G.shallow_copy()
+	for e in removed_edges:
+		C_G.remove_edge(e)
+	for w in removed_vertices:
+		C_G.remove_vertex(w)
+	for v in new_vertices:
+		C_G.add_vertex(v)
+	for e, e_bar in new_edges:
+		C_G.add_edge(e, e_bar)
+
+	g_V = f1.f.f_V.copy()
+	for w in removed_vertices:
+		del g_V[w]
+	for v, rep in vertex_map.items():
+		if rep not in g_V:
+			g_V[rep] = vertex_image(v)
+
+	g_E = f1.f.f_E.copy()
+	for e in removed_edges:
+		del g_E[e]
+	for e, rep in edge_map.items():
+		if rep not in g_E:
+			g_E[rep] = edge_image(e)
+
+	g = GraphMorphism(C_G, X.G, g_V, g_E, trusted = True)
+
+	# Only faces of Y along identified edges can change or fold onto one another, and they are refolded in the
+	# same order as fold_complex_morphism, followed by the faces of D
+	touched_faces = set()
+	for e in touched_edges:
+		if e in Y_G.edges:
+			touched_faces.update(Y.edge_faces.get(Y_G.oriented(e), ()))
+
+	refold = [(face, f1.face_maps[face]) for face in Y.faces if face in touched_faces]
+	refold += [(face, f2.face_maps[face]) for face in D.faces]
+
+	vertex_to_indice = {}
+	new_faces = []
+	replaced = {}
+	C_B_face_maps = f1.face_maps.copy()
+	registered = set()
+	for face, fm in refold:
+		ind = 0
+		C_face = []
+		for i in range(len(face)):
+			e = edge_map.get(face[i], face[i])
+			initial_vertex = (e.initial, (fm.target, fm.initial(i)))
+			if initial_vertex in registered:
 				break
 
-		if not folded:
-			break
+			if initial_vertex not in vertex_to_indice:
+				vertex_to_indice[initial_vertex] = (ind, len(new_faces), fm.orientation)
+				ind += 1
+
+			C_face.append(e)
+			registered.add(initial_vertex)
+
+		if face in touched_faces:
+			del C_B_face_maps[face]
+
+		if C_face != []:
+			C_face = Face(C_face)
+			new_faces.append(C_face)
+			C_B_face_maps[C_face] = FaceMap(C_face, fm.target, fm.start_index, fm.orientation, origin_start_index = fm.origin_start_index)
+			replaced[face] = C_face
+		else:
+			replaced[face] = None
+
+	C_faces = [replaced.get(face, face) for face in Y.faces]
+	C_faces += [replaced[face] for face in D.faces]
+	C_faces = [face for face in C_faces if face != None]
+
+	# Patch the face incidences of Y: drop the touched faces, then count the new ones. Faces along an edge and free
+	# edges are kept in the order in which they occur along C.faces, as Complex would list them.
+	position = {face:i for i, face in enumerate(C_faces)}
+	edge_faces = dict(Y.edge_faces)
+	free = dict(Y.free)
+	changed = set()
+	for face in touched_faces:
+		for e in face:
+			changed.add(Y_G.oriented(e))
+	for e in changed:
+		faces = tuple(face for face in edge_faces[e] if face not in touched_faces)
+		if len(faces) > 0:
+			edge_faces[e] = faces
+		else:
+			del edge_faces[e]
+	for face in new_faces:
+		for e in face:
+			e = C_G.oriented(e)
+			edge_faces[e] = edge_faces.get(e, ()) + (face,)
+			changed.add(e)
+	for e in changed:
+		faces = edge_faces.get(e, ())
+		if len(faces) > 1:
+			edge_faces[e] = tuple(sorted(faces, key = position.get))
+		if len(faces) == 1:
+			free[e] = faces[0]
+		else:
+			free.pop(e, None)
+
+	def occurrence(item):
+		e, face = item
+		e_bar = C_G.bar(e)
+		return position[face], next(i for i in range(len(face)) if face[i] == e or face[i] == e_bar)
+
+	C = Complex(C_G, [])
+	C.faces = C_faces
+	C.edge_faces = edge_faces
+	C.free = dict(sorted(free.items(), key = occurrence))
+
+	imm = ComplexMorphism(C, X, g, C_B_face_maps, trusted = True)
+	if not include_maps:
+		return imm
+
+	p_V = SetFunction({v:vertex_map.get(v, v) for v in Y_G.vertices})
+	p_E = SetFunction({e:edge_map.get(e, e) for e in Y_G.edges})
+	p = GraphMorphism(Y_G, C_G, p_V, p_E, trusted = True)
+
+	face_maps = SetFunction()
+	for face in Y.faces:
+		if face not in touched_faces:
+			face_maps[face] = FaceMap(face, face, 0, 1)
+			continue
+
+		fm = f1.face_maps[face]
+		e = edge_map.get(face[0], face[0])
+		ind, f_ind, orient = vertex_to_indice[(e.initial, (fm.target, fm.initial(0)))]
+		face_maps[face] = FaceMap(face, new_faces[f_ind], ind, fm.orientation * orient)
+
+	proj = ComplexMorphism(Y, C, p, face_maps, trusted = True)
+
+	return imm, proj
+
+'''
+	Returns the decomposition G -> G_fold, G_fold -> H of the graph morphism f : G -> H
+	Folds are found with a worklist of admissible pairs, and identifications are tracked with union-find,
+	so each vertex and edge is touched a near-constant number of times.
+	If lazy is True a FoldLog is returned in place of the projection, which is then only built on demand.
+'''
+def fold_graph_morphism(f, lazy = False):
+	G = f.domain
+	vertices = UnionFind()
+	edges = UnionFind()
+	vertex_pairs = []
+	edge_pairs = []
+
+	# For each vertex class, one representative edge leaving it per image edge
+	out = {}
+	pairs = []
+	for e in G.edges:
+		v_out = out.setdefault(e.initial, {})
+		im = f.f_E[e]
+		if im in v_out:
+			pairs.append((v_out[im], e))
+		else:
+			v_out[im] = e
+
+	# Already an immersion
+	if len(pairs) == 0:
+		log = FoldLog(G, G, {v:v for v in G.vertices}, {e:e for e in G.edges})
+		if lazy:
+			return log, f
+		return log.projection(), f
+
+	while len(pairs) > 0:
+		e1, e2 = pairs.pop()
+		if edges.union(e1, e2) is None:
+			continue
+		edge_pairs.append((e1, e2))
+
+		# Identifying the terminal vertices may give rise to new admissible pairs
+		merged = vertices.union(e1.terminal, e2.terminal)
+		if merged is None:
+			continue
+		root, absorbed = merged
+		vertex_pairs.append((root, absorbed))
+		small = out.pop(absorbed, {})
+		large = out.get(root, {})
+		if len(small) > len(large):
+			small, large = large, small
+		out[root] = large
+		for im, e in small.items():
+			if im in large:
+				pairs.append((large[im], e))
+			else:
+				large[im] = e
+
+	newV = {}
+	for v in G.vertices:
+		r = vertices.find(v)
+		if r not in newV:
+			newV[r] = r.copy()
 
-	return proj, f
+	newE = {}
+	for e in G.orientation:
+		r = edges.find(e)
+		if r in newE or edges.find(G.bar(e)) in newE:
+			continue
+		newE[r] = Edge(newV[vertices.find(e.initial)], newV[vertices.find(e.terminal)], label = e.label)
+
+	G_fold = Graph(set(newV.values()), set(newE.values()), add_vertices_from_edges = False)
+	for r, e in list(newE.items()):
+		newE[edges.find(G.bar(r))] = G_fold.bar(e)
+
+	g_V = SetFunction({v:f.f_V[r] for r, v in newV.items()})
+	g_E = SetFunction({e:f.f_E[r] for r, e in newE.items()})
+	g = GraphMorphism(G_fold, f.codomain, g_V, g_E, trusted = True)
+
+	vertex_map = {v:newV[vertices.find(v)] for v in G.vertices}
+	edge_map = {e:newE[edges.find(e)] for e in G.edges}
+	log = FoldLog(G, G_fold, vertex_map, edge_map, vertex_pairs, edge_pairs)
+	if lazy:
+		return log, g
+	return log.projection(), g
+
+'''
+	Record of a fold G -> G_fold: the identified (root, absorbed) vertex pairs and folded edge pairs in the order
+	they were made, together with the quotient maps on vertices and edges.
+	The projection is only built as a GraphMorphism, once, when projection() is called.
+'''
+class FoldLog:
+	def __init__(self, domain, codomain, vertex_map, edge_map, vertex_pairs = [], edge_pairs = []):
+		self.domain = domain
+		self.codomain = codomain
+		self.vertex_map = vertex_map
+		self.edge_map = edge_map
+		self.vertex_pairs = vertex_pairs
+		self.edge_pairs = edge_pairs
+		self._projection = None
+
+	# Number of folds performed
+	def __len__(self):
+		return len(self.edge_pairs)
+
+	def projection(self):
+		if self._projection == None:
+			self._projection = GraphMorphism(self.domain, self.codomain, SetFunction(self.vertex_map), SetFunction(self.edge_map), trusted = True)
+		return self._projection
+
+'''
+	Disjoint set forest over hashable elements with path halving and union by size.
+	Elements are added lazily, so anything not yet seen is its own singleton class.
+'''
+class UnionFind:
+	def __init__(self):
+		self.parent = {}
+		self.size = {}
+
+	def find(self, x):
+		parent = self.parent
+		while x in parent:
+			p = parent[x]
+			if p in parent:
+				parent[x] = parent[p]
+			x = p
+		return x
+
+	'''
+		Merges the classes of x and y. Returns (root, absorbed) for the surviving and merged roots,
+		or None if x and y were already in the same class.
+	'''
+	def union(self, x, y):
+		x = self.find(x)
+		y = self.find(y)
+		if x == y:
+			return None
+
+		size_x = self.size.get(x, 1)
+		size_y = self.size.get(y, 1)
+		if size_x < size_y:
+			x, y = y, x
+		self.parent[y] = x
+		self.size[x] = size_x + size_y
+		self.size.pop(y, None)
+		return x, y
 
 '''
 	Returns the factoring of f through G/[e1 = e2]
@@ -113,7 +527,7 @@ def fold_admissible_pair(f, e1, e2):
 	for e in G.edges:
 		g_E[proj.f_E[e]] = f.f_E[e]
 
-	g = GraphMorphism(G_fold, f.codomain, g_V, g_E)
+	g = GraphMorphism(G_fold, f.codomain, g_V, g_E, trusted = True)
 
 	# Sanity check
 	#assert GraphMorphism.compose(g, proj) == f
@@ -140,16 +554,8 @@ def fold_admissible_pair_graph(G, e1, e2):
 
 	e1p = newE[e1]
 	e2p = newE[e2]
-	if wp != vp:
-		Gp.remove_vertex(wp, remove_edges = False)
 	Gp.remove_edge(e2p)
-
-	if wp != vp:
-		for e in Gp.edges:
-			if e.terminal == wp:
-				e.terminal = vp
-			if e.initial == wp:
-				e.initial = vp
+	Gp.identify_vertices(vp, wp)
 
 	f_V = SetFunction(newV)
 	f_E = SetFunction(newE)
@@ -157,4 +563,4 @@ def fold_admissible_pair_graph(G, e1, e2):
 	f_E[e2] = e1p
 	f_E[G.bar(e2)] = Gp.bar(e1p)
 
-	return GraphMorphism(G, Gp, f_V, f_E)
+	return GraphMorphism(G, Gp, f_V, f_E, trusted = True)
@@ -1,5 +1,9 @@
 from facialtree import *
+from canonical import canonical_form, codomain_ranks
 import itertools
+import heapq
+import parallel
+import time
 
 def order_preserve_remove_duplicates(seq):
 	seen = set()
@@ -70,4 +74,123 @@ def resolve_free_faces(f, max_depth = 10, max_resolutions = 100, check_npi = Non
 
 	if len(to_resolve) > 0:
 		print('Failed to resolve all free faces with computation bounds.')
-	return resolutions
\ No newline at end of file
+	return resolutions
+
+# Default priority of resolve_free_faces_prioritized: fewest free faces first
+def fewest_free_faces(g, free_faces):
+	return len(free_faces)
+
+'''
+	Resolves the free faces of f like resolve_free_faces, but always works on the pending immersion with the least
+	priority(g, free_faces), first in first out among ties, and never revisits an immersion isomorphic to one already
+	queued. Stops once max_resolutions are found, max_nodes free faces have been resolved or max_time seconds have
+	passed, whichever comes first.
+'''
+def resolve_free_faces_prioritized(f, max_resolutions = 100, max_nodes = 10000, max_time = None, priority = fewest_free_faces, check_npi = None):
+	ranks = codomain_ranks(f.codomain)
+	seen = {canonical_form(f, ranks)}
+
+	free_faces = f.domain.free_faces(edges_only = True)
+	queue = [(priority(f, free_faces), 0, f, free_faces)]
+	count = 1
+	nodes = 0
+	start = time.time()
+	resolutions = []
+	while len(queue) > 0 and len(resolutions) < max_resolutions:
+		if nodes >= max_nodes or (max_time != None and time.time() - start > max_time):
+			break
+
+		_, _, g, free_faces = heapq.heappop(queue)
+		if check_npi != None:
+			check_npi(g)
+
+		if len(free_faces) == 0:
+			resolutions.append(g)
+			continue
+
+		# Resolve the earliest arising free face first
+		nodes += 1
+		for resol, embedded in resolve_free_face(g, free_faces[0], embed_free_faces = free_faces[1:]):
+			key = canonical_form(resol, ranks)
+			if key in seen:
+				continue
+			seen.add(key)
+
+			resol_free = order_preserve_remove_duplicates(embedded + resol.domain.free_faces(edges_only = True))
+			heapq.heappush(queue, (priority(resol, resol_free), count, resol, resol_free))
+			count += 1
+
+	if len(queue) > 0 and len(resolutions) < max_resolutions:
+		print('Failed to resolve all free faces with computation bounds.')
+	return resolutions
+
+'''
+	Resolves the free faces of f level by level, with the entries of each level spread over a multiprocessing pool (or
+	resolved in turn if pool is None). Each entry resolves its earliest arising free face. As in
+	resolve_free_faces_prioritized, a resolution isomorphic to one already met, at this level or an earlier one, is
+	dropped, so each isomorphism class is yielded or expanded once.
+	Results are merged in the order of the level, and the resolutions of each entry are sorted by canonical form, so the
+	output is the same with and without a pool, and does not depend on how the objects were numbered (as long as X has
+	distinct labels, see codomain_order). It is not the output of resolve_free_faces, which stops each level at its
+	first resolution. Resolutions are yielded as soon as they come back rather than once their level is done.
+	check_npi is called in the caller on f and on every resolution of a free face which is not a repeat.
+'''
+def iter_resolve_free_faces_parallel(f, pool = None, max_depth = 10, max_resolutions = 100, check_npi = None, chunksize = 1):
+	if check_npi != None:
+		check_npi(f)
+
+	free_faces = f.domain.free_faces(edges_only = True)
+	if len(free_faces) == 0:
+		yield f
+		return
+
+	X = f.codomain
+	seen = {canonical_form(f, codomain_ranks(X))}
+	context = [X, X.G] + list(X.G.vertices) + list(X.G.edges) + list(X.faces)
+	level = [(f, free_faces)]
+	found = 0
+	for d in range(max_depth):
+		if pool == None:
+			results = (_resolve_entry(context, entry) for entry in level)
+		else:
+			results = parallel.imap(pool, _resolve_entry, context, level, chunksize = chunksize)
+
+		next_level = []
+		for entry_resolutions in results:
+			for key, resol, resol_free in entry_resolutions:
+				if key in seen:
+					continue
+				seen.add(key)
+
+				if check_npi != None:
+					check_npi(resol)
+
+				if len(resol_free) > 0:
+					next_level.append((resol, resol_free))
+					continue
+
+				yield resol
+				found += 1
+				if found >= max_resolutions:
+					return
+
+		level = next_level
+		if len(level) == 0:
+			return
+
+	print('Failed to resolve all free faces with computation bounds.')
+
+def resolve_free_faces_parallel(f, pool = None, max_depth = 10, max_resolutions = 100, check_npi = None):
+	return list(iter_resolve_free_faces_parallel(f, pool = pool, max_depth = max_depth, max_resolutions = max_resolutions, check_npi = check_npi))
+
+# Resolves the earliest arising free face of an entry (g, free_faces) of a level, giving (canonical form, resolution,
+# free faces) sorted by canonical form
+def _resolve_entry(context, entry):
+	g, free_faces = entry
+	ranks = codomain_ranks(g.codomain)
+	resolutions = []
+	for resol, embedded in resolve_free_face(g, free_faces[0], embed_free_faces = free_faces[1:]):
+		resol_free = order_preserve_remove_duplicates(embedded + resol.domain.free_faces(edges_only = True))
+		resolutions.append((canonical_form(resol, ranks), resol, resol_free))
+	resolutions.sort(key = lambda item: item[0])
+	return resolutions
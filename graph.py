@@ -1,6 +1,6 @@
 from setfunction import SetFunction
+import verification
 from labels import Edge, Vertex
-import itertools
 
 class Graph:
 	def __init__(self, vertices, edges, add_vertices_from_edges = True):
@@ -32,6 +32,19 @@ class Graph:
 			bar_edges.add(e_bar)
 		self.edges |= bar_edges
 
+		self.index_edges()
+
+	'''
+		Rebuilds the incidence index, which maps each vertex to the set of edges with that initial vertex.
+		Must be called after assigning vertices/edges directly rather than through the constructor.
+	'''
+	def index_edges(self):
+		self.incidence = {v:set() for v in self.vertices}
+		for e in self.edges:
+			if e.initial not in self.incidence:
+				self.incidence[e.initial] = set()
+			self.incidence[e.initial].add(e)
+
 	def oriented(self, e):
 		if e not in self.orientation:
 			e = self.bar(e)
@@ -47,12 +60,36 @@ class Graph:
 	def bar(self, edge):
 		return self.bar_map[edge]
 
+	def add_vertex(self, v):
+		self.vertices.add(v)
+		self.incidence.setdefault(v, set())
+
+	'''
+		Adds the edge e to the orientation along with its bar, which is created if not given.
+		Endpoints of e not yet in the graph are added.
+	'''
+	def add_edge(self, e, e_bar = None):
+		if e_bar == None:
+			e_bar = e.bar()
+		for v in [e.initial, e.terminal]:
+			if v not in self.vertices:
+				self.add_vertex(v)
+
+		self.edges.add(e)
+		self.edges.add(e_bar)
+		self.orientation.add(e)
+		self.bar_map[e] = e_bar
+		self.bar_map[e_bar] = e
+		self.incidence.setdefault(e.initial, set()).add(e)
+		self.incidence.setdefault(e_bar.initial, set()).add(e_bar)
+
 	def remove_vertex(self, v, remove_edges = True):
 		self.vertices.discard(v)
 		if remove_edges:
-			for e in self.edges:
-				if e.initial == v or e.terminal == v:
-					self.remove_edge(e)
+			# Edges ending at v are the bars of edges starting at v
+			for e in list(self.incidence.get(v, ())):
+				self.remove_edge(e)
+			self.incidence.pop(v, None)
 
 	def remove_edge(self, e):
 		if e not in self.edges:
@@ -62,29 +99,44 @@ class Graph:
 		self.orientation.discard(e_bar)
 		self.edges.discard(e)
 		self.edges.discard(e_bar)
+		self.incidence[e.initial].discard(e)
+		self.incidence[e_bar.initial].discard(e_bar)
 		del self.bar_map[e]
 		del self.bar_map[e_bar]
 
+	'''
+		Re-points every edge incident at w to v and removes w from the graph.
+	'''
+	def identify_vertices(self, v, w):
+		if v == w:
+			return
+
+		moved = self.incidence.pop(w, set())
+		for e in moved:
+			e.initial = v
+			self.bar(e).terminal = v
+		self.incidence.setdefault(v, set()).update(moved)
+		self.vertices.discard(w)
+
 	# Returns the edges incident at v
 	def neighborhood(self, v):
-		nbhd = set()
-		for e in self.edges:
-			if e.initial == v:
-				nbhd.add(e)
-		return nbhd
+		return set(self.incidence.get(v, ()))
 
 	# Returns out edges wrt orientation
 	def out_edges(self, v):
-		return self.neighborhood(v).intersection(self.orientation)
+		return set(e for e in self.incidence.get(v, ()) if e in self.orientation)
 
 	# Returns in edges wrt orientation
 	def in_edges(self, v):
-		return self.neighborhood(v).difference(self.orientation)
+		return set(e for e in self.incidence.get(v, ()) if e not in self.orientation)
+
+	def degree(self, v):
+		return len(self.incidence.get(v, ()))
 
 	# Returns whether the graph is a disjoint union of cycles
 	def is_open_linear(self):
 		for v in self.vertices:
-			if not len(self.neighborhood(v)) == 2:
+			if not self.degree(v) == 2:
 				return False
 		return True
 
@@ -99,23 +151,34 @@ class Graph:
 			return G
 		return G, newV, newE
 
+	'''
+		Copy of the graph which shares its vertex and edge objects, but whose structure can be modified independently.
+	'''
+	def shallow_copy(self):
+		G = Graph([], [])
+		G.vertices = self.vertices.copy()
+		G.edges = self.edges.copy()
+		G.orientation = self.orientation.copy()
+		G.bar_map = self.bar_map.copy()
+		G.incidence = {v:edges.copy() for v, edges in self.incidence.items()}
+		return G
+
 	@staticmethod
 	def wedge(G1, v1, G2, v2, include_maps = False):
 		if v1 not in G1.vertices or v2 not in G2.vertices:
 			raise Exception('Vertices must belong to respective graphs to form wedge.')
 
+		# Separate vertex maps, so that the wedge is right even if G1 and G2 share vertices
 		w = v1.copy()
-		vertex_map = {v1:w, v2:w}
-
-		newV1, newE1 = G1.copy(maps_only = True, vertex_map = vertex_map)
-		newV2, newE2 = G2.copy(maps_only = True, vertex_map = vertex_map)
+		newV1, newE1 = G1.copy(maps_only = True, vertex_map = {v1:w})
+		newV2, newE2 = G2.copy(maps_only = True, vertex_map = {v2:w})
 
 		G = Graph(set(newV1.values()) | set(newV2.values()), set(newE1.values()) | set(newE2.values()), add_vertices_from_edges = False)
 		if not include_maps:
 			return G
 
-		f1 = Morphism(G1, G, SetFunction(newV1), SetFunction(newE1))
-		f2 = Morphism(G2, G, SetFunction(newV2), SetFunction(newE2))
+		f1 = Morphism(G1, G, SetFunction(newV1), SetFunction(newE1), trusted = True)
+		f2 = Morphism(G2, G, SetFunction(newV2), SetFunction(newE2), trusted = True)
 
 		return G, f1, f2
 
@@ -131,8 +194,8 @@ class Graph:
 		if not include_arrows:
 			return G
 
-		f1 = Morphism(G1, G, SetFunction({v:newV1[v] for v in G1.vertices}), SetFunction({e:newE1[e] for e in G1.orientation}))
-		f2 = Morphism(G2, G, SetFunction({v:newV2[v] for v in G2.vertices}), SetFunction({e:newE2[e] for e in G2.orientation}))
+		f1 = Morphism(G1, G, SetFunction({v:newV1[v] for v in G1.vertices}), SetFunction({e:newE1[e] for e in G1.orientation}), trusted = True)
+		f2 = Morphism(G2, G, SetFunction({v:newV2[v] for v in G2.vertices}), SetFunction({e:newE2[e] for e in G2.orientation}), trusted = True)
 
 		return G, f1, f2
 
@@ -151,8 +214,7 @@ class Graph:
 		while len(to_check) > 0:
 			new_to_check = []
 			for w in to_check:
-				out_edges = self.neighborhood(w)
-				for e in out_edges:
+				for e in self.incidence.get(w, ()):
 					ww = e.terminal
 					if ww not in seen:
 						seen.add(ww)
@@ -169,6 +231,7 @@ class Graph:
 		bar_map = {e:self.bar_map[e] for e in edges}
 		T.edges = edges
 		T.bar_map = bar_map
+		T.index_edges()
 
 		# Should be a tree
 		if len(T.vertices) - len(T.orientation) != 1:
@@ -180,12 +243,24 @@ class Graph:
 	def __eq__(self, other):
 		if not isinstance(other, Graph):
 			return False
+		if self is other:
+			return True
 
 		return self.vertices == other.vertices and self.edges == other.edges and self.orientation == other.orientation
 
 	def __repr__(self):
 		return f'Vertices: {self.vertices}\nOrientation: {self.orientation}'
 
+	'''
+		Pickled as its vertices and oriented edges with their bars, the rest being rebuilt on load.
+		The labels stay objects rather than integer arrays (as in binaryformat), since faces, morphisms and the context
+		of parallel refer to them individually and pickle keeps them shared only as objects. Batches of pieces come out
+		no larger than binaryformat this way, while a single piece costs about a third more.
+	'''
+	def __reduce__(self):
+		orientation = list(self.orientation)
+		return (_unpickle_graph, (list(self.vertices), orientation, [self.bar_map[e] for e in orientation]))
+
 	'''
 		Json serializes a graph.
 	'''
@@ -215,34 +290,46 @@ class Graph:
 		G.edges = _edges
 		G.orientation = orientation
 		G.bar_map = bar_map
+		G.index_edges()
 
 		if not uid_maps:
 			return G
 		return G, vertices, edges
 
 class Morphism:
-	def __init__(self, domain, codomain, f_V, f_E):
+	'''
+		Trusted morphisms are ones built internally which are correct by construction,
+		they are only checked as far as the verification level asks for.
+	'''
+	def __init__(self, domain, codomain, f_V, f_E, trusted = False):
 		self.domain = domain
 		self.codomain = codomain
 		self.f_V = f_V
 		self.f_E = f_E
 
+		checks = verification.checks(trusted)
+
 		# Basic verification
-		if not self.f_V.domain == self.domain.vertices:
-			raise Exception('f_V does not have proper domain.')
-		if not self.f_V.mapsto(self.codomain.vertices):
-			raise Exception('f_V does not have proper codomain.')
-		if not self.f_E.mapsto(self.codomain.edges):
-			raise Exception('f_E does not have proper codomain.')
-			
+		if checks >= verification.CHEAP:
+			if not self.f_V.domain == self.domain.vertices:
+				raise Exception('f_V does not have proper domain.')
+			if not self.f_V.mapsto(self.codomain.vertices):
+				raise Exception('f_V does not have proper codomain.')
+			if not self.f_E.mapsto(self.codomain.edges):
+				raise Exception('f_E does not have proper codomain.')
+
 		# Extend in involution preserving way if f_E is only defined on the orientation of domain
-		if self.f_E.domain == self.domain.orientation:
+		if len(self.f_E) != len(self.domain.edges) and self.f_E.domain == self.domain.orientation:
 			for e in self.domain.orientation:
 				f_E[self.domain.bar(e)] = self.codomain.bar(f_E[e])
 
 		# Basic verification
-		if not self.f_E.domain == self.domain.edges:
-			raise Exception('f_E does not have proper domain.')
+		if checks >= verification.CHEAP:
+			if not self.f_E.domain == self.domain.edges:
+				raise Exception('f_E does not have proper domain.')
+
+		if checks < verification.FULL:
+			return
 
 		# Preserves bar map
 		for e in self.domain.edges:
@@ -256,10 +343,13 @@ class Morphism:
 
 	def is_immersion(self):
 		for v in self.domain.vertices:
-			for e1, e2 in itertools.product(self.domain.neighborhood(v), repeat = 2):
-				if self.f_E[e1] == self.f_E[e2] and e1 != e2:
+			images = set()
+			for e in self.domain.incidence.get(v, ()):
+				im = self.f_E[e]
+				if im in images:
 					return False
-		
+				images.add(im)
+
 		return True
 
 	# The composite f circ g
@@ -271,13 +361,13 @@ class Morphism:
 		h_V = SetFunction.compose(f.f_V, g.f_V)
 		h_E = SetFunction.compose(f.f_E, g.f_E)
 
-		return Morphism(g.domain, f.codomain, h_V, h_E)
+		return Morphism(g.domain, f.codomain, h_V, h_E, trusted = True)
 
 	@staticmethod
 	def identity(G):
 		f_V = SetFunction({v:v for v in G.vertices})
 		f_E = SetFunction({e:e for e in G.edges})
-		return Morphism(G, G, f_V, f_E)
+		return Morphism(G, G, f_V, f_E, trusted = True)
 
 	'''
 		Visualize a morphism.
@@ -296,6 +386,12 @@ class Morphism:
 
 		return self.f_V == other.f_V and self.f_E == other.f_E
 
+	# Pickled as the images of the vertices and oriented edges, the map on bars being rebuilt on load
+	def __reduce__(self):
+		vertices = list(self.f_V.keys())
+		edges = list(self.domain.orientation)
+		return (_unpickle_morphism, (self.domain, self.codomain, vertices, [self.f_V[v] for v in vertices], edges, [self.f_E[e] for e in edges]))
+
 	'''
 		Given morphisms f1 : G1 -> H, f2 : G2 -> H, return the disjoint union f : G1 cup G2 -> H.
 	'''
@@ -320,7 +416,7 @@ class Morphism:
 		for e in G2.edges:
 			f_E[incl2.f_E[e]] = f2.f_E[e]
 
-		return Morphism(G, f1.codomain, f_V, f_E)
+		return Morphism(G, f1.codomain, f_V, f_E, trusted = True)
 
 	'''
 		Serialize to json.
@@ -343,10 +439,25 @@ class Morphism:
 		f_V = SetFunction({domain_v_map[int(k)]:codomain_v_map[int(v)] for k,v in data['f_V'].items()})
 		f_E = SetFunction({domain_e_map[int(k)]:codomain_e_map[int(v)] for k,v in data['f_E'].items()})
 
-		f = Morphism(domain, codomain, f_V, f_E)
+		f = Morphism(domain, codomain, f_V, f_E, trusted = True)
 
 		if not uid_maps:
 			return f
 
 		return f, domain_v_map, domain_e_map, codomain_v_map, codomain_e_map
 
+def _unpickle_graph(vertices, orientation, bars):
+	G = Graph([], [])
+	G.vertices = set(vertices)
+	G.orientation = set(orientation)
+	G.edges = set(orientation)
+	G.edges.update(bars)
+	G.bar_map = {}
+	for e, e_bar in zip(orientation, bars):
+		G.bar_map[e] = e_bar
+		G.bar_map[e_bar] = e
+	G.index_edges()
+	return G
+
+def _unpickle_morphism(domain, codomain, vertices, vertex_images, edges, edge_images):
+	return Morphism(domain, codomain, SetFunction(zip(vertices, vertex_images)), SetFunction(zip(edges, edge_images)), trusted = True)
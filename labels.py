@@ -1,4 +1,9 @@
+'''
+	Labels are slotted and hashed by their integer uid, since every set and dict operation in the library hashes them.
+	Uids are only unique within a process, so pickling a label does not keep its uid.
+'''
 class Vertex:
+	__slots__ = ('label', 'uid')
 	counter = 0
 	def __init__(self, label = ''):
 		self.label = str(label)
@@ -11,7 +16,7 @@ class Vertex:
 		return self.uid == other.uid
 
 	def __hash__(self):
-		return hash(f'Vertex{self.uid}')
+		return self.uid
 
 	def __repr__(self):
 		return self.label
@@ -19,7 +24,12 @@ class Vertex:
 	def copy(self):
 		return Vertex(label = self.label)
 
+	# Unpickled labels get fresh uids, so they never clash with labels made in the unpickling process
+	def __reduce__(self):
+		return (Vertex, (self.label,))
+
 class Edge:
+	__slots__ = ('label', 'uid', 'initial', 'terminal')
 	counter = 0
 	def __init__(self, initial, terminal, label = ''):
 		self.label = str(label)
@@ -35,7 +45,7 @@ class Edge:
 		return self.uid == other.uid
 
 	def __hash__(self):
-		return hash(f'Edge{self.uid}')
+		return self.uid
 
 	def __repr__(self):
 		return self.label + f'({self.initial} -> {self.terminal})'
@@ -43,6 +53,9 @@ class Edge:
 	def bar(self):
 		return Edge(self.terminal, self.initial, label = self.label + 'i')
 
+	def __reduce__(self):
+		return (Edge, (self.initial, self.terminal, self.label))
+
 	def copy(self, vertex_map = {}, vertex_copy = False):
 		v1 = self.initial
 		v2 = self.terminal
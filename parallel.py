@@ -0,0 +1,66 @@
+import io
+import pickle
+
+'''
+	Pickling of work on complexes sent to worker processes.
+	The caller and the worker share a context, a list of objects which is pickled once with the task. Anything in the
+	context is pickled by its index instead of by value, so results sent back refer to the caller's own objects:
+	e.g. a child immersion comes back mapping into the caller's X, and the map parent -> child starts at the parent.
+'''
+
+'''
+	The objects of the complex morphisms fs which results may refer to: their domains and codomains, skeleta, labels,
+	faces and face maps.
+'''
+def context_objects(*fs):
+	objects = []
+	for f in fs:
+		for X in [f.domain, f.codomain]:
+			objects += [X, X.G]
+			objects += list(X.G.vertices)
+			objects += list(X.G.edges)
+			objects += list(X.faces)
+		objects += [f, f.f]
+		objects += list(f.face_maps.values())
+	return objects
+
+class ContextPickler(pickle.Pickler):
+	def __init__(self, file, context):
+		super(ContextPickler, self).__init__(file, pickle.HIGHEST_PROTOCOL)
+		self.index = {id(obj):i for i, obj in enumerate(context)}
+
+	def persistent_id(self, obj):
+		return self.index.get(id(obj))
+
+class ContextUnpickler(pickle.Unpickler):
+	def __init__(self, file, context):
+		super(ContextUnpickler, self).__init__(file)
+		self.context = context
+
+	def persistent_load(self, pid):
+		return self.context[pid]
+
+def dumps(obj, context):
+	buffer = io.BytesIO()
+	ContextPickler(buffer, context).dump(obj)
+	return buffer.getvalue()
+
+def loads(data, context):
+	return ContextUnpickler(io.BytesIO(data), context).load()
+
+'''
+	Maps func over the items in chunks on a multiprocessing pool, yielding the results in order.
+	func(context, item) is called in the workers on their copy of the context; items and results may refer to context.
+'''
+def imap(pool, func, context, items, chunksize = 16):
+	context_data = pickle.dumps(context, pickle.HIGHEST_PROTOCOL)
+	tasks = [(func, context_data, dumps(items[i:i + chunksize], context)) for i in range(0, len(items), chunksize)]
+	for data in pool.imap(_run_chunk, tasks):
+		for result in loads(data, context):
+			yield result
+
+def _run_chunk(task):
+	func, context_data, items_data = task
+	context = pickle.loads(context_data)
+	items = loads(items_data, context)
+	return dumps([func(context, item) for item in items], context)
@@ -0,0 +1,129 @@
+import sqlite3
+import json
+import os
+import re
+import time
+
+'''
+	SQLite store of mining results, replacing the one json file per counterexample in counterexamples/.
+	Each row is a (word, n, depth, iterations, status, wall time, immersion) record, where the immersion is the json of
+	a complex morphism and status is one of the statuses below. Rows are indexed by (word, n) and by status, so the
+	miner can tell what is already done without listing a directory.
+'''
+
+# Weak NPI counterexample, i.e. an immersion with chi > 1
+WEAK = 'weak'
+# NPI counterexample
+NORMAL = 'normal'
+# Mined without finding a counterexample
+NONE = 'none'
+
+COUNTEREXAMPLES = (WEAK, NORMAL)
+
+SCHEMA = '''
+	CREATE TABLE IF NOT EXISTS results (
+		id INTEGER PRIMARY KEY,
+		word TEXT,
+		n INTEGER,
+		depth INTEGER,
+		iterations INTEGER,
+		status TEXT NOT NULL,
+		wall_time REAL,
+		immersion TEXT,
+		source TEXT UNIQUE,
+		created REAL NOT NULL
+	);
+	CREATE INDEX IF NOT EXISTS results_word ON results (word, n);
+	CREATE INDEX IF NOT EXISTS results_status ON results (status);
+'''
+
+class ResultStore:
+	def __init__(self, path = 'results.db'):
+		self.path = path
+		# Waits on other processes writing to the same file rather than failing
+		self.connection = sqlite3.connect(path, timeout = 60)
+		self.connection.executescript(SCHEMA)
+
+	def close(self):
+		self.connection.close()
+
+	'''
+		Adds a row and returns its id. The immersion may be given as a complex morphism or as its json.
+		Rows with a source (e.g. the file they were imported from) are only added once, None being returned for repeats.
+	'''
+	def record(self, word = None, n = None, status = NONE, depth = None, iterations = None, wall_time = None, immersion = None, source = None, created = None):
+		if status not in COUNTEREXAMPLES and status != NONE:
+			raise Exception(f'Unknown status {status}.')
+		if immersion != None and not isinstance(immersion, str):
+			immersion = json.dumps(immersion.json())
+		if created == None:
+			created = time.time()
+
+		with self.connection:
+			cursor = self.connection.execute(
+				'INSERT OR IGNORE INTO results (word, n, depth, iterations, status, wall_time, immersion, source, created) '
+				'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+				(word, n, depth, iterations, status, wall_time, immersion, source, created))
+		if cursor.rowcount == 0:
+			return None
+		return cursor.lastrowid
+
+	'''
+		The (word, n) with a counterexample of the given statuses, optionally for one n only.
+	'''
+	def discovered(self, n = None, statuses = COUNTEREXAMPLES):
+		query = f'SELECT DISTINCT word, n FROM results WHERE word IS NOT NULL AND status IN ({", ".join("?" * len(statuses))})'
+		args = list(statuses)
+		if n != None:
+			query += ' AND n = ?'
+			args.append(n)
+		return [(word, k) for word, k in self.connection.execute(query, args)]
+
+	'''
+		The words with a row for n, whatever their status, i.e. the words a sweep can skip on resuming.
+	'''
+	def mined(self, n):
+		return set(word for word, in self.connection.execute('SELECT DISTINCT word FROM results WHERE n = ? AND word IS NOT NULL', (n,)))
+
+	def has(self, word, n):
+		return self.connection.execute('SELECT 1 FROM results WHERE word = ? AND n = ? LIMIT 1', (word, n)).fetchone() != None
+
+	'''
+		Generates (word, n, status, immersion) for the rows with an immersion, the immersion loaded as a complex morphism.
+	'''
+	def counterexamples(self, statuses = COUNTEREXAMPLES):
+		from complex import Morphism
+
+		query = f'SELECT word, n, status, immersion FROM results WHERE immersion IS NOT NULL AND status IN ({", ".join("?" * len(statuses))}) ORDER BY id'
+		for word, n, status, immersion in self.connection.execute(query, list(statuses)).fetchall():
+			yield word, n, status, Morphism.load_json(json.loads(immersion))
+
+	def __len__(self):
+		return self.connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+	'''
+		Imports the json files written by check_wnpi and checknpi.sage into the store, reading the word, n, status and
+		time from their names (weak-w=<word>-n=<n>-<time>.json or <status>-ex<rand>-<time>.json).
+		Files already imported are skipped, so this can be run on every start. Returns the number of rows added.
+	'''
+	def import_directory(self, directory = 'counterexamples'):
+		if not os.path.isdir(directory):
+			return 0
+
+		added = 0
+		for name in sorted(os.listdir(directory)):
+			m = re.fullmatch(r'(weak|normal)-w=([abAB]+)-n=([0-9]+)-([0-9.]+)\.json', name)
+			if m:
+				status, word, n, created = m.group(1), m.group(2), int(m.group(3)), float(m.group(4))
+			else:
+				m = re.fullmatch(r'(weak|normal)-ex[0-9]+-([0-9]+)\.json', name)
+				if not m:
+					continue
+				status, word, n, created = m.group(1), None, None, float(m.group(2))
+
+			with open(os.path.join(directory, name)) as f:
+				immersion = f.read()
+			if self.record(word, n, status = status, immersion = immersion, source = name, created = created) != None:
+				added += 1
+
+		return added
@@ -0,0 +1,195 @@
+from facialtree import get_children, random_child
+from canonical import canonical_form, codomain_ranks
+import heapq
+import math
+import random
+
+'''
+	Search strategies over the facial tree of X. A strategy grows pieces with get_children, scores them with a
+	heuristic and returns (score, piece) for the best piece it saw, the root included.
+	Heuristics take an immersion and return a number, larger being better.
+'''
+
+def chi(imm):
+	return imm.domain.chi()
+
+# Fewer faces with a free edge is better
+def free_faces(imm):
+	return -len(set(imm.domain.free.values()))
+
+# Fewer free edges is better
+def boundary_length(imm):
+	return -len(imm.domain.free)
+
+'''
+	Weighted sum of heuristics, e.g. Weighted((chi, 1), (boundary_length, 0.1)).
+'''
+class Weighted:
+	def __init__(self, *terms):
+		self.terms = terms
+
+	def __call__(self, imm):
+		return sum(w * h(imm) for h, w in self.terms)
+
+'''
+	Base class of the strategies, which define run(X, root, depth, check_npi = None) and call start at its beginning.
+	check_npi is passed on to get_children, so it sees every child built.
+	With unique, isomorphic children are merged and pieces isomorphic to one already seen are not visited again.
+'''
+class Search:
+	def __init__(self, heuristic = chi, unique = True, pool = None):
+		self.heuristic = heuristic
+		self.unique = unique
+		self.pool = pool
+		self.expanded = 0
+
+	def start(self, X, root, check_npi):
+		self.X = X
+		self.check_npi = check_npi
+		self.expanded = 0
+		self.ranks = codomain_ranks(X)
+		self.seen = set()
+		self.best = (self.heuristic(root), root)
+		self.visit(root)
+
+	# Returns False if the piece, or one isomorphic to it, was already visited
+	def visit(self, piece):
+		if self.unique:
+			key = canonical_form(piece, self.ranks)
+			if key in self.seen:
+				return False
+			self.seen.add(key)
+		return True
+
+	def children(self, piece):
+		self.expanded += 1
+		children = get_children(self.X, piece, check_npi = self.check_npi, unique = self.unique, pool = self.pool)
+		return [child for child in children if self.visit(child)]
+
+	def score(self, piece):
+		score = self.heuristic(piece)
+		if score > self.best[0]:
+			self.best = (score, piece)
+		return score
+
+'''
+	Always expands the best scoring piece found so far which is less than depth below the root, until max_expansions
+	pieces have been expanded.
+'''
+class BestFirst(Search):
+	def __init__(self, heuristic = chi, max_expansions = 100, unique = True, pool = None):
+		super(BestFirst, self).__init__(heuristic = heuristic, unique = unique, pool = pool)
+		self.max_expansions = max_expansions
+
+	def run(self, X, root, depth, check_npi = None):
+		self.start(X, root, check_npi)
+
+		# Entries are (-score, insertion count, depth, piece), the count keeping ties first in first out
+		heap = [(-self.best[0], 0, 0, root)]
+		count = 1
+		while len(heap) > 0 and self.expanded < self.max_expansions:
+			_, _, d, piece = heapq.heappop(heap)
+			if d >= depth:
+				continue
+			for child in self.children(piece):
+				heapq.heappush(heap, (-self.score(child), count, d + 1, child))
+				count += 1
+
+		return self.best
+
+'''
+	Keeps the width best scoring pieces at each level, down to depth levels below the root.
+'''
+class Beam(Search):
+	def __init__(self, heuristic = chi, width = 8, unique = True, pool = None):
+		super(Beam, self).__init__(heuristic = heuristic, unique = unique, pool = pool)
+		self.width = width
+
+	def run(self, X, root, depth, check_npi = None):
+		self.start(X, root, check_npi)
+
+		level = [root]
+		for d in range(depth):
+			scored = []
+			for piece in level:
+				scored += [(self.score(child), child) for child in self.children(piece)]
+			if len(scored) == 0:
+				break
+			# Stable, so ties keep the order in which the children were built
+			scored.sort(key = lambda item: -item[0])
+			level = [child for _, child in scored[:self.width]]
+
+		return self.best
+
+class Node:
+	def __init__(self, piece, depth):
+		self.piece = piece
+		self.depth = depth
+		self.children = None
+		self.visits = 0
+		self.total = 0
+
+	def value(self):
+		return self.total / self.visits
+
+'''
+	Monte Carlo tree search. Each iteration descends the tree of expanded pieces by UCT, expands the leaf it reaches,
+	and scores it by a random walk (with random_child, as traverse does) from one of its children down to depth,
+	the reward being the best heuristic value along the walk. Rewards should be of order 1 for the exploration
+	constant to be meaningful.
+	Without a seed, each run draws a fresh random state, so copies of the strategy sent to worker processes (e.g. in
+	traverse data) do not all make the same choices. With a seed, every run starts from the same random state.
+'''
+class MCTS(Search):
+	def __init__(self, heuristic = chi, iterations = 100, exploration = 1.0, seed = None, unique = True, pool = None):
+		super(MCTS, self).__init__(heuristic = heuristic, unique = unique, pool = pool)
+		self.iterations = iterations
+		self.exploration = exploration
+		self.seed = seed
+
+	def run(self, X, root, depth, check_npi = None):
+		self.random = random.Random(self.seed)
+		self.start(X, root, check_npi)
+
+		tree = Node(root, 0)
+		for _ in range(self.iterations):
+			path = [tree]
+			node = tree
+			while node.children != None and len(node.children) > 0:
+				node = self.select(node)
+				path.append(node)
+
+			if node.depth < depth and node.children == None:
+				node.children = [Node(child, node.depth + 1) for child in self.children(node.piece)]
+				if len(node.children) > 0:
+					node = self.random.choice(node.children)
+					path.append(node)
+
+			reward = self.rollout(node, depth)
+			for n in path:
+				n.visits += 1
+				n.total += reward
+
+			# Nothing left to explore
+			if tree.children != None and len(tree.children) == 0:
+				break
+
+		return self.best
+
+	def select(self, node):
+		unvisited = [child for child in node.children if child.visits == 0]
+		if len(unvisited) > 0:
+			return self.random.choice(unvisited)
+
+		log_visits = math.log(node.visits)
+		return max(node.children, key = lambda child: child.value() + self.exploration * math.sqrt(log_visits / child.visits))
+
+	def rollout(self, node, depth):
+		piece = node.piece
+		reward = self.score(piece)
+		for _ in range(node.depth, depth):
+			piece = random_child(self.X, piece, check_npi = self.check_npi, rng = self.random)
+			if piece == None:
+				break
+			reward = max(reward, self.score(piece))
+		return reward
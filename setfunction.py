@@ -1,27 +1,102 @@
+'''
+	A dict viewed as a function. The domain and a reverse index value -> set of keys are maintained incrementally,
+	so the image is the reference counted multiset of values (the count of y being len(preimages[y])).
+'''
 class SetFunction(dict):
 	def __init__(self, *args, **kw):
 		super(SetFunction, self).__init__(*args, **kw)
 		self.domain = set(super(SetFunction, self).keys())
-		self.image = set(super(SetFunction, self).values())
+		self.preimages = {}
+		for k, v in super(SetFunction, self).items():
+			self._add_preimage(k, v)
+
+	def _add_preimage(self, key, value):
+		keys = self.preimages.get(value)
+		if keys == None:
+			self.preimages[value] = {key}
+		else:
+			keys.add(key)
+
+	def _remove_preimage(self, key, value):
+		keys = self.preimages[value]
+		keys.discard(key)
+		if len(keys) == 0:
+			del self.preimages[value]
+
+	@property
+	def image(self):
+		return self.preimages.keys()
 
 	def __setitem__(self, key, value):
+		if key in self:
+			self._remove_preimage(key, super(SetFunction, self).__getitem__(key))
 		super(SetFunction, self).__setitem__(key, value)
 		self.domain.add(key)
-		self.image = set(super(SetFunction, self).values())
+		self._add_preimage(key, value)
 
 	def __delitem__(self, key):
+		value = super(SetFunction, self).__getitem__(key)
 		super(SetFunction, self).__delitem__(key)
-		self.domain = set(super(SetFunction, self).keys())
-		self.image = set(super(SetFunction, self).values())
+		self.domain.discard(key)
+		self._remove_preimage(key, value)
+
+	# The remaining mutators of dict bypass __setitem__/__delitem__, so route them through
+	def update(self, *args, **kw):
+		for k, v in dict(*args, **kw).items():
+			self[k] = v
+
+	def __ior__(self, other):
+		self.update(other)
+		return self
+
+	def setdefault(self, key, default = None):
+		if key not in self:
+			self[key] = default
+		return self[key]
+
+	def pop(self, key, *default):
+		if key not in self:
+			return super(SetFunction, self).pop(key, *default)
+		value = self[key]
+		del self[key]
+		return value
+
+	def popitem(self):
+		key, value = super(SetFunction, self).popitem()
+		self.domain.discard(key)
+		self._remove_preimage(key, value)
+		return key, value
+
+	def clear(self):
+		super(SetFunction, self).clear()
+		self.domain.clear()
+		self.preimages.clear()
+
+	# Copying the index directly is cheaper than rebuilding it
+	def copy(self):
+		f = SetFunction()
+		dict.update(f, self)
+		f.domain = self.domain.copy()
+		f.preimages = {y:keys.copy() for y, keys in self.preimages.items()}
+		return f
+
+	def __reduce__(self):
+		return (SetFunction, (dict(self),))
 
 	def mapsto(self, codomain):
-		return self.image.issubset(codomain)
+		image = self.preimages.keys()
+		# Fast paths on sizes before checking containment
+		if len(image) == 0:
+			return True
+		if len(image) > len(codomain):
+			return False
+		return all(y in codomain for y in image)
 
 	def imageof(self, A):
-		return set(v for k,v in self.items() if k in A)
+		return set(self[k] for k in A if k in self)
 
 	def preimage(self, y):
-		return set(k for k,v in self.items() if v == y)
+		return set(self.preimages.get(y, ()))
 
 	def restriction(self, A):
 		return SetFunction({k:v for k,v in self.items() if k in A})
@@ -36,4 +111,4 @@ class SetFunction(dict):
 		for x,y in g.items():
 			composite[x] = f[y]
 
-		return SetFunction(composite)
\ No newline at end of file
+		return SetFunction(composite)
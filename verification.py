@@ -0,0 +1,46 @@
+from contextlib import contextmanager
+
+'''
+	Library wide verification level for the construction of graph and complex morphisms.
+
+	OFF:   no checks at all.
+	CHEAP: morphisms built by hand are fully checked, while morphisms built by trusted internal constructors
+	       (folding, wedging, composition, json loading, ...) only get the basic domain/codomain checks.
+	FULL:  every morphism is fully checked, including trusted ones. Useful for debugging.
+'''
+OFF = 0
+CHEAP = 1
+FULL = 2
+
+level = CHEAP
+
+def set_level(new_level):
+	global level
+	if new_level not in (OFF, CHEAP, FULL):
+		raise Exception('Verification level must be one of OFF, CHEAP or FULL.')
+	level = new_level
+
+def get_level():
+	return level
+
+'''
+	Returns the level of checking a morphism construction should perform.
+'''
+def checks(trusted = False):
+	if level == OFF or trusted:
+		return level
+	return FULL
+
+'''
+	Temporarily sets the verification level, e.g.
+		with verification_level(FULL):
+			...
+'''
+@contextmanager
+def verification_level(new_level):
+	old_level = level
+	set_level(new_level)
+	try:
+		yield
+	finally:
+		set_level(old_level)
@@ -1,5 +1,6 @@
 from train_track import *
 import itertools
+import cyclicword
 from multiset import Multiset
 
 def cyclically_reduced(w):
@@ -11,16 +12,11 @@ def cyclically_reduced(w):
 	return F(tietze)
 
 def cyclically_equal(w1, w2):
-	w1 = w1.Tietze()
-	w2 = w2.Tietze()
-	if len(w1) != len(w2):
-		return False
+	return cyclicword.cyclically_equal(w1.Tietze(), w2.Tietze())
 
-	for i in range(len(w1)):
-		if w1[i:] + w1[:i] == w2:
-			return True
-
-	return False
+# Inverse of a word in Tietze form
+def tietze_inverse(t):
+	return tuple(-x for x in reversed(t))
 
 def word_length(w):
 	return len(w.Tietze())
@@ -44,8 +40,9 @@ class ConjCyclicSubgroup:
 	def __len__(self):
 		return word_length(self.gen)
 
+	# Agrees for conjugates of gen and of its inverse, as __eq__ does
 	def __hash__(self):
-		return hash(self.gen) + hash(self.gen.inverse())
+		return hash(cyclicword.cyclic_key(self.gen.Tietze(), reverse = tietze_inverse))
 
 	def __repr__(self):
 		return f'C(<{self.gen}>)'
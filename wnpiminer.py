@@ -5,15 +5,24 @@ from graph import Graph, Morphism as GraphMorphism
 from facialtree import *
 from folding import fold_complex_morphism
 from presentation import Presentation
-import sys, time, random, json, os
+from cyclicword import canonical_rotation, inverse_word
+from resultstore import ResultStore, WEAK, NONE
+import sys, time, random, json, queue, itertools
 
-def check_wnpi(imm, filename = None):
+'''
+	Stops with SystemExit on a weak NPI counterexample, i.e. an immersion with chi > 1, after appending it to hits if
+	given (e.g. to be recorded in a ResultStore by the caller), or else writing it to the json file filename.
+'''
+def check_wnpi(imm, filename = None, hits = None):
 	if imm.domain.chi() > 1:
-		if filename == None:
-			filename = f'counterexamples/weak-ex{random.randint(0, 100)}-{int(time.time())}.json'
-		with open(filename, 'w') as f:
-			f.write(json.dumps(imm.json()))
-			print('Weak NPI Counterexample Found')
+		if hits != None:
+			hits.append(imm)
+		else:
+			if filename == None:
+				filename = f'counterexamples/weak-ex{random.randint(0, 100)}-{int(time.time())}.json'
+			with open(filename, 'w') as f:
+				f.write(json.dumps(imm.json()))
+		print('Weak NPI Counterexample Found')
 		sys.exit(0)
 
 # Generate all words in a,b of length `length` with exponent sum m in b
@@ -42,81 +51,272 @@ def cyclically_reduced_word_sum(length, m):
 				continue
 		yield w
 
-def cyclically_equal(w1, w2):
-	if len(w1) != len(w2):
-		return False
-	for i in range(len(w1)):
-		if w1[i:] + w1[:i] == w2:
-			return True
-	return False
+# Letters in the order in which word_sum_generator runs through them, an inverse pair differing in the last bit
+LETTERS = ['a', 'A', 'b', 'B']
+B_EXPONENTS = [0, 0, 1, -1]
 
+'''
+	Generates the cyclically reduced words in a,b of length `length` with exponent sum m in b up to cycling, one per
+	cyclic class, as the least rotation in the order a < A < b < B. They come in lexicographic order, the same words in
+	the same order as filtering cyclically_reduced_word_sum by rotation.
+	Iterative Fredricksen-Kessler-Maiorana generation of necklaces, where a prefix is abandoned as soon as it stops
+	being reduced or can no longer reach exponent sum m, so nothing is kept of the words already generated.
+'''
 def unique_up_to_cycling(length, m):
-	seen = []
-	for w in cyclically_reduced_word_sum(length, m):
-		unique = True
-		for ww in seen:
-			if cyclically_equal(w, ww):
-				unique = False
-				break
-		if not unique:
+	if length == 0:
+		if m == 0:
+			yield ''
+		return
+
+	n = length
+	# a[1..t] is the current prefix, with a[t] = -1 before any letter has been tried at t, period[t] the period of
+	# a[1..t - 1] and b_sum[t] the exponent sum in b of a[1..t]
+	a = [0] + [-1]*n
+	period = [1]*(n + 1)
+	b_sum = [0]*(n + 1)
+	t = 1
+	while t > 0:
+		p = period[t]
+		base = a[t - p] if t > 1 else 0
+		x = max(a[t] + 1, base)
+		while x < 4:
+			if t == 1 or x != a[t - 1] ^ 1:
+				s = b_sum[t - 1] + B_EXPONENTS[x]
+				if abs(m - s) <= n - t:
+					break
+			x += 1
+
+		if x == 4:
+			a[t] = -1
+			t -= 1
 			continue
-		seen.append(w)
-		yield w
 
+		a[t] = x
+		b_sum[t] = s
+		if x != base:
+			p = t
+
+		if t < n:
+			t += 1
+			period[t] = p
+		elif n % p == 0 and (n == 1 or a[n] != a[1] ^ 1):
+			yield ''.join(LETTERS[x] for x in a[1:])
+
+LETTER_RANK = {c:i for i, c in enumerate(LETTERS)}
+
+def b_exponent_sum(w):
+	return sum(B_EXPONENTS[LETTER_RANK[c]] for c in w)
+
+# The least rotation of w in the order a < A < b < B, as generated by unique_up_to_cycling
+def necklace(w):
+	return canonical_rotation(w, key = LETTER_RANK.get)
+
+'''
+	The automorphisms of the free group on a, b permuting the letters up to inverses, i.e. a -> a^(+-1), b -> b^(+-1)
+	and a -> b^(+-1), b -> a^(+-1), which send the relator r to a cyclic rotation of r or of its inverse. These give
+	isomorphic presentation complexes when applied to the other relators. Each is a dict letter -> letter.
+'''
+def relator_symmetries(r):
+	targets = {canonical_rotation(r), canonical_rotation(inverse_word(r))}
+	symmetries = []
+	for x, y in [('a', 'b'), ('b', 'a')]:
+		for x_image, y_image in itertools.product([x, x.upper()], [y, y.upper()]):
+			phi = {'a':x_image, 'A':x_image.swapcase(), 'b':y_image, 'B':y_image.swapcase()}
+			if canonical_rotation(''.join(phi[c] for c in r)) in targets:
+				symmetries.append(phi)
+	return symmetries
+
+'''
+	The representative of w in the words with exponent sum m in b, up to cycling, inverting w and applying the
+	symmetries, as the first of them which unique_up_to_cycling generates. It only depends on the orbit of w, and
+	is None if the orbit has no word with exponent sum m.
+'''
+def orbit_representative(w, symmetries, m):
+	representative = None
+	for phi in symmetries:
+		image = ''.join(phi[c] for c in w)
+		for v in [image, inverse_word(image)]:
+			if b_exponent_sum(v) != m:
+				continue
+			v = necklace(v)
+			if representative == None or [LETTER_RANK[c] for c in v] < [LETTER_RANK[c] for c in representative]:
+				representative = v
+	return representative
+
+'''
+	The words of unique_up_to_cycling(length, m) which are the representatives of their orbits under the symmetries
+	of the second relator b a^n B A^(n + 1) and inversion, as (words, total, by_symmetry, by_skip) with total the
+	number of words before reducing. Orbits containing a word of skip (e.g. words already mined) are left out entirely.
+	by_symmetry counts the words left out as they are not the representatives of their orbits, i.e. what the symmetry
+	reduction saves, and by_skip the representatives left out for skip.
+'''
+def symmetry_reduced_words(length, m, n, skip = []):
+	symmetries = relator_symmetries('b' + 'a'*n + 'B' + 'A'*(n + 1))
+	skipped = set(orbit_representative(w, symmetries, m) for w in skip)
+	words = []
+	total = 0
+	by_symmetry = 0
+	by_skip = 0
+	for w in unique_up_to_cycling(length, m):
+		total += 1
+		if orbit_representative(w, symmetries, m) != w:
+			by_symmetry += 1
+		elif w in skipped:
+			by_skip += 1
+		else:
+			words.append(w)
+	return words, total, by_symmetry, by_skip
+
+'''
+	Walks down the facial tree from a random face of X, checking every child built, where the random walk only builds
+	children until it finds a facially strict one at each step. data is (X, depth, output) or
+	(X, depth, output, strategy) to run a search.Search strategy in place of the uniform random walk, where output is
+	passed on to check_wnpi as a filename, or as hits if it is a list.
+	Returns True if a counterexample was found.
+'''
 def traverse(data):
-	X, depth, filename = data
+	X, depth, output = data[:3]
+	strategy = data[3] if len(data) > 3 else None
+	if isinstance(output, list):
+		check_npi = lambda g: check_wnpi(g, hits = output)
+	else:
+		check_npi = lambda g: check_wnpi(g, filename = output)
 
 	eps = random.randrange(len(X.faces))
-	f = Complex.disc_diagram(X, X.faces[eps], 1)
+	f = disc_diagram(X, X.faces[eps], 1)
 	proj, imm = fold_complex_morphism(f)
 
+	if strategy != None:
+		try:
+			strategy.run(X, imm, depth, check_npi = check_npi)
+		except SystemExit:
+			return True
+		return False
+
 	parent = imm
 	for d in range(depth):
 		try:
-			children = get_children(X, parent, check_npi = lambda g: check_wnpi(g, filename = filename))
+			parent = random_child(X, parent, check_npi = check_npi)
 		except SystemExit:
 			return True
 
-		parent = random.choice(children)
+		if parent == None:
+			break
 
 	return False
 
-def get_discovered():
-	fnames = os.listdir('./counterexamples')
+'''
+	The presentation complex of <a, b | w, b a^n B A^(n + 1)>.
+'''
+def word_complex(w, n):
+	P = Presentation.from_strings(['a', 'b'], [w, 'b' + 'a'*n + 'B' + 'A'*(n + 1)])
+	return P.complex()
+
+# Complexes built in this process, keyed by (w, n), so a worker builds each one once
+_complexes = {}
+
+'''
+	Runs traverse for a (w, n, iteration, depth) task, building the complex of (w, n) locally rather than receiving it.
+	Returns (w, n, found, wall time, json of the counterexample or None).
+'''
+def mine_task(task):
+	w, n, iteration, depth = task
+	if (w, n) not in _complexes:
+		_complexes[(w, n)] = word_complex(w, n)
+
+	start = time.time()
+	hits = []
+	found = traverse((_complexes[(w, n)], depth, hits))
+	immersion = json.dumps(hits[0].json()) if len(hits) > 0 else None
+	return w, n, found, time.time() - start, immersion
+
+'''
+	Mines the words for counterexamples with one pool of worker processes, running max_iters traversals of the given
+	depth per (w, n). At most window tasks are in flight at a time (twice the number of processes by default). Once a
+	counterexample is found for a word, its remaining tasks are not submitted and the results of those still in
+	flight are dropped, while the tasks of other words carry on.
+	Results go to the ResultStore store, one row per word: the counterexample as soon as it is found, or a row with
+	status NONE once all its traversals are done, with the number of traversals run and their total time. Only this
+	process writes to the store. Returns the list of (w, n) found.
+'''
+def mine(words, n, store, depth = 10, max_iters = 30, processes = None, window = None):
+	import multiprocessing as mp
+
+	if processes == None:
+		processes = max(mp.cpu_count() - 1, 1)
+	if window == None:
+		window = 2*processes
+
+	def tasks():
+		for w in words:
+			for iteration in range(max_iters):
+				if (w, n) in found:
+					progress.update(max_iters - iteration)
+					break
+				yield (w, n, iteration, depth)
+
 	found = []
-	import re
-	for name in fnames:
-		m = re.search(r'weak-w=([abAB]+)-n=([0-9]+).*', name)
-		if m:
-			w = m.group(1)
-			n = int(m.group(2))
-			found.append((w,n))
+	# Traversals done and their total time, per word still being mined
+	done = {w:[0, 0.0] for w in words}
+	results = queue.Queue()
+	pending = 0
+	with mp.Pool(processes) as pool:
+		remaining = tasks()
+		with tqdm(total = len(words)*max_iters) as progress:
+			while True:
+				while pending < window:
+					task = next(remaining, None)
+					if task == None:
+						break
+					pool.apply_async(mine_task, (task,), callback = results.put, error_callback = results.put)
+					pending += 1
+
+				if pending == 0:
+					break
+
+				result = results.get()
+				pending -= 1
+				if isinstance(result, BaseException):
+					raise result
+
+				w, n, is_found, wall_time, immersion = result
+				progress.update(1)
+				if (w, n) in found:
+					continue
+
+				done[w][0] += 1
+				done[w][1] += wall_time
+				if is_found:
+					print(f'Found a counterexample for {w}')
+					found.append((w, n))
+					store.record(w, n, status = WEAK, depth = depth, iterations = done[w][0], wall_time = done[w][1], immersion = immersion)
+				elif done[w][0] == max_iters:
+					store.record(w, n, status = NONE, depth = depth, iterations = max_iters, wall_time = done[w][1])
+
 	return found
 
 if __name__ == '__main__':
-	import itertools
-
 	n = 1
 	depth = 10
 	max_iters = 30
-	# Use multiprocessing
-	import multiprocessing as mp
 
-	discovered = get_discovered()
-	for length in range(5, 6):
-		for w in unique_up_to_cycling(length, 1):
-			if (w,n) in discovered:
-				continue
-
-			P = Presentation.from_strings(['a', 'b'], [w, 'b' + 'a'*n + 'B' + 'A'*(n + 1)])
-			X = P.complex()
+	store = ResultStore('results.db')
+	imported = store.import_directory('counterexamples')
+	if imported > 0:
+		print(f'Imported {imported} counterexamples into {store.path}')
 
-			print(f'On word {w}...')
-			filename = f'counterexamples/weak-w={w}-n={n}-{time.time()}.json'
+	# Words with a row were mined before, whether or not a counterexample was found
+	mined = store.mined(n)
+	words = []
+	total = 0
+	by_symmetry = 0
+	by_skip = 0
+	for length in range(5, 6):
+		length_words, length_total, length_by_symmetry, length_by_skip = symmetry_reduced_words(length, 1, n, skip = mined)
+		words += length_words
+		total += length_total
+		by_symmetry += length_by_symmetry
+		by_skip += length_by_skip
 
-			pool = mp.Pool(mp.cpu_count() - 1)
-			for found in tqdm(pool.imap_unordered(traverse, itertools.repeat((X, depth, filename), max_iters)), total = max_iters):
-				if found:
-					pool.terminate()
-					break
-			pool.close()
\ No newline at end of file
+	print(f'Mining {len(words)} of {total} words: symmetry saved {by_symmetry} words, {by_skip} more were already mined')
+	mine(words, n, store, depth = depth, max_iters = max_iters)